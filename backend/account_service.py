@@ -5,6 +5,16 @@ from bson import ObjectId
 from bson.errors import InvalidId
 import secrets
 import os
+import json
+from datetime import datetime
+import pika
+from confirmed_publisher import ConfirmedPublisher
+from db_indexes import ensure_indexes_in_background
+from pagination import paginate, InvalidCursor
+from config import (
+    RABBITMQ_HOST, RABBITMQ_PORT, RABBITMQ_USER, RABBITMQ_PASS, RABBITMQ_VHOST,
+    RABBITMQ_HEARTBEAT, ACCOUNT_UPDATED_QUEUE
+)
 
 app = Flask(__name__)
 
@@ -17,6 +27,40 @@ db = client.bitebuddies  # Connect to the 'bitebuddies' database
 
 # Reference to the 'account' collection
 accounts_collection = db.account
+ensure_indexes_in_background(db, ["account"])
+
+# Profile fields that other services copy into their own documents (e.g. pending matches)
+DENORMALIZED_FIELDS = {"name", "email", "preferences"}
+
+def get_rabbitmq_connection():
+    credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
+    parameters = pika.ConnectionParameters(
+        host=RABBITMQ_HOST,
+        port=RABBITMQ_PORT,
+        virtual_host=RABBITMQ_VHOST,
+        credentials=credentials,
+        heartbeat=RABBITMQ_HEARTBEAT,
+        blocked_connection_timeout=30,
+        connection_attempts=1
+    )
+    return pika.BlockingConnection(parameters)
+
+# Account-changed events are queued and confirmed in the background, so updates never wait on RabbitMQ
+account_event_publisher = ConfirmedPublisher(ACCOUNT_UPDATED_QUEUE, get_rabbitmq_connection)
+
+# Publish an account-changed event if a copied profile field changed
+def publish_account_updated(account, update_data, previous_email):
+    if not DENORMALIZED_FIELDS & set(update_data):
+        return
+    event = {
+        "email": account["email"],
+        "name": account.get("name"),
+        "preferences": account.get("preferences", {}),
+        "updated_at": datetime.now().isoformat()
+    }
+    if previous_email != account["email"]:
+        event["previous_email"] = previous_email
+    account_event_publisher.publish(json.dumps(event))
 
 # Utility function to convert MongoDB ObjectId to string
 def mongo_to_dict(mongo_obj):
@@ -92,16 +136,31 @@ def login():
         print(f"Login error: {e}")
         return jsonify({"code": 500, "message": "An error occurred during login."}), 500
 
+# Account-changed event publisher counters (queued, confirmed, dropped, latency)
+@app.route("/account/events/metrics", methods=["GET"])
+def account_event_metrics():
+    return jsonify(account_event_publisher.metrics()), 200
+
 @app.route("/account/all", methods=["GET"])
 def get_all_accounts():
     try:
-        accounts = list(accounts_collection.find({}))
+        accounts, next_cursor = paginate(
+            accounts_collection,
+            limit=request.args.get("limit"),
+            cursor=request.args.get("cursor")
+        )
         accounts = [mongo_to_dict(account) for account in accounts]
         return jsonify({
             "code": 200,
             "data": accounts,
+            "next_cursor": next_cursor,
             "message": f"Found {len(accounts)} account(s)."
         }), 200
+    except InvalidCursor as e:
+        return jsonify({
+            "code": 400,
+            "message": str(e)
+        }), 400
     except Exception as e:
         print(f"Error retrieving accounts: {e}")
         return jsonify({
@@ -211,6 +270,7 @@ def account_by_email(email):
             
             # Get the updated account
             updated_account = accounts_collection.find_one({"email": data.get('email', clean_email)})
+            publish_account_updated(updated_account, update_data, clean_email)
             
             return jsonify({
                 "code": 200,
@@ -297,9 +357,6 @@ def handle_linkedin_auth():
         }), 500
 
 # Start the Flask app
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
-
 # Update account details
 @app.route("/account/<user_id>", methods=["PUT"])
 def update_account(user_id):
@@ -358,6 +415,7 @@ def update_account(user_id):
         
         # Get the updated account
         updated_account = accounts_collection.find_one({"_id": object_id})
+        publish_account_updated(updated_account, update_data, existing_account["email"])
         
         return jsonify({
             "code": 200,
@@ -371,3 +429,6 @@ def update_account(user_id):
             "code": 500,
             "message": f"An error occurred while updating the account: {str(e)}"
         }), 500
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5000, debug=True)
@@ -10,6 +10,8 @@ from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from urllib.parse import urlparse
 from functools import wraps
+from db_indexes import ensure_indexes_in_background
+from pagination import paginate, InvalidCursor
 
 # Suppress Werkzeug access logs
 log = logging.getLogger('werkzeug')
@@ -61,6 +63,8 @@ def connect_to_mongodb():
     return None
 
 mongo = connect_to_mongodb()
+if mongo is not None:
+    ensure_indexes_in_background(mongo.db, ["availability_log"])
 
 # Helper for serializing Mongo documents
 def serialize_doc(doc):
@@ -92,8 +96,16 @@ def test_db():
 @app.route("/availability/<string:user_email>", methods=['GET'])
 @require_mongo_connection
 def get_all_availability(user_email):
-    availability = list(mongo.db.availability_log.find({'user_email': user_email}))
-    return jsonify({"code": 200, "data": [serialize_doc(doc) for doc in availability]})
+    try:
+        availability, next_cursor = paginate(
+            mongo.db.availability_log,
+            {'user_email': user_email},
+            limit=request.args.get('limit'),
+            cursor=request.args.get('cursor')
+        )
+    except InvalidCursor as e:
+        return jsonify({"code": 400, "message": str(e)}), 400
+    return jsonify({"code": 200, "data": [serialize_doc(doc) for doc in availability], "next_cursor": next_cursor})
 
 @app.route("/availability/<string:user_email>/<string:date>", methods=['GET'])
 @require_mongo_connection
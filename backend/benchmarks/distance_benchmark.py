@@ -0,0 +1,81 @@
+"""
+Microbenchmark for the distance kernels used by the matching and restaurant
+services.
+
+Compares the old per-pair geopy geodesic loop, a per-pair haversine loop and
+the vectorized geo_distance.distances_from kernel at several candidate counts.
+
+Usage:
+    python benchmarks/distance_benchmark.py [--sizes 1000 10000 100000] [--radius 2.0]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add backend directory to path for importing the shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geo_distance import distances_from, haversine_km
+
+try:
+    from geopy.distance import geodesic
+except ImportError:
+    geodesic = None
+
+# Rough bounding box around Singapore
+SG_LAT_RANGE = (1.22, 1.47)
+SG_LNG_RANGE = (103.60, 104.05)
+
+
+def random_points(count, seed=42):
+    rng = random.Random(seed)
+    lats = [rng.uniform(*SG_LAT_RANGE) for _ in range(count)]
+    lngs = [rng.uniform(*SG_LNG_RANGE) for _ in range(count)]
+    return lats, lngs
+
+
+def best_of(repeats, fn):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes, radius_km, repeats):
+    origin = (1.3521, 103.8198)
+    print(f"{'candidates':>10} {'geodesic':>12} {'haversine':>12} {'vectorized':>12} {'speedup':>10}")
+    for size in sizes:
+        lats, lngs = random_points(size)
+
+        def geodesic_loop():
+            return [geodesic(origin, (lat, lng)).kilometers <= radius_km for lat, lng in zip(lats, lngs)]
+
+        def haversine_loop():
+            return [haversine_km(origin[0], origin[1], lat, lng) <= radius_km for lat, lng in zip(lats, lngs)]
+
+        def vectorized():
+            return distances_from(origin[0], origin[1], lats, lngs, radius_km)
+
+        # geodesic is slow enough that one pass is plenty at large sizes
+        geodesic_time = best_of(1, geodesic_loop) if geodesic else None
+        haversine_time = best_of(repeats, haversine_loop)
+        vectorized_time = best_of(repeats, vectorized)
+
+        baseline = geodesic_time if geodesic_time is not None else haversine_time
+        geodesic_label = f"{geodesic_time * 1000:10.2f}ms" if geodesic_time is not None else f"{'n/a':>12}"
+        print(
+            f"{size:>10} {geodesic_label} {haversine_time * 1000:10.2f}ms "
+            f"{vectorized_time * 1000:10.2f}ms {baseline / vectorized_time:9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark distance kernels")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--radius", type=float, default=2.0)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.radius, args.repeats)
@@ -0,0 +1,283 @@
+"""
+End-to-end benchmark for the matching engines.
+
+Seeds a database with a synthetic Singapore population (see
+synthetic_population.py), then drives matching_service.find_matches +
+save_matches and search_service.find_matches for a sample of active
+searchers (search_service.find_matches is the inline fallback that delegates
+to the incremental matcher). Reports p50/p95/p99 latency, Mongo operations per search and
+matches per second as JSON, tagged with the current git commit so results
+can be compared across commits. Each matcher starts from the same freshly
+reset population, and the run fails if they find different numbers of matches.
+
+By default it runs against an in-memory mongomock database
+(pip install mongomock). Pass --mongo-uri to use a real local MongoDB; the
+benchmark drops and refills the account, search_requests and matches
+collections of the chosen database, so never point it at production.
+
+Usage:
+    python benchmarks/matching_benchmark.py --sizes 1000 10000 --searches 200 --output results.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+# Add backend directory to path for importing the services
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# The services open module-level clients at import time; keep those pointed at a
+# local server so loading them never touches the shared cluster. The benchmark
+# itself only uses the database passed to each matcher.
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+
+import matching_service
+from db_indexes import ensure_indexes
+from spatial_index import SpatialGridIndex
+from synthetic_population import generate_population, load_population
+
+import config
+
+# Collection methods that each cost one round trip to MongoDB
+MONGO_OPERATIONS = {
+    "find", "find_one", "insert_one", "insert_many", "update_one", "update_many",
+    "bulk_write", "distinct", "aggregate", "count_documents", "create_index",
+    "find_one_and_update", "delete_many", "replace_one",
+}
+
+
+class CountingCollection:
+    """Wraps a pymongo collection and counts calls to each operation"""
+
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in MONGO_OPERATIONS and callable(attr):
+            def counted(*args, **kwargs):
+                self._counter[f"{self._collection.name}.{name}"] += 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+class CountingDatabase:
+    """Wraps a pymongo database so every collection it hands out is counted"""
+
+    def __init__(self, database):
+        self._database = database
+        self.counter = Counter()
+
+    def __getitem__(self, name):
+        return CountingCollection(self._database[name], self.counter)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+def open_database(mongo_uri, database_name):
+    if mongo_uri:
+        from pymongo import MongoClient
+        return MongoClient(mongo_uri)[database_name]
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("mongomock is not installed; pip install mongomock or pass --mongo-uri")
+    return mongomock.MongoClient()[database_name]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(matcher, population, latencies, total_matches, elapsed, counter, extra=None):
+    searches = len(latencies)
+    total_ops = sum(counter.values())
+    result = {
+        "matcher": matcher,
+        "population": population,
+        "searches": searches,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mongo_ops_per_search": round(total_ops / searches, 2) if searches else 0,
+        "mongo_ops_breakdown": dict(counter),
+        "matches": total_matches,
+        "matches_per_second": round(total_matches / elapsed, 2) if elapsed else 0,
+        "searches_per_second": round(searches / elapsed, 2) if elapsed else 0,
+    }
+    if extra:
+        result.update(extra)
+    return result
+
+
+def reset_matching_state(database):
+    """
+    Put the population back the way load_population left it, so every matcher
+    starts from the same state: no matches, no claimed or processed requests,
+    and a cold spatial index.
+    """
+    database.matches.delete_many({})
+    database.search_requests.update_many(
+        {}, {"$unset": {"processed": "", "matching_claimed_at": "", "matching_claim": ""}}
+    )
+    matching_service.active_index = SpatialGridIndex(cell_km=config.PROXIMITY_THRESHOLD_KM)
+    matching_service._index_seeded = False
+    matching_service._index_last_id = None
+
+
+def bench_matching_service(database, population, sample):
+    counted = CountingDatabase(database)
+    reset_matching_state(database)
+
+    # Start from a cold spatial index so seeding cost is measured too
+    seed_start = time.perf_counter()
+    matching_service.seed_active_index(counted)
+    seed_ms = (time.perf_counter() - seed_start) * 1000
+    counted.counter.clear()
+
+    latencies = []
+    total_matches = 0
+    run_start = time.perf_counter()
+    for search_request in sample:
+        start = time.perf_counter()
+        matches = matching_service.find_matches(
+            counted,
+            search_request["user_email"],
+            search_request["location"],
+            {"restaurant": search_request.get("restaurant") or {}},
+            str(search_request["_id"])
+        )
+        matching_service.save_matches(counted, matches)
+        latencies.append(time.perf_counter() - start)
+        total_matches += len(matches)
+    elapsed = time.perf_counter() - run_start
+
+    return summarize("matching_service", population, latencies, total_matches, elapsed, counted.counter,
+                     {"index_seed_ms": round(seed_ms, 3)})
+
+
+def bench_search_service(database, population, sample):
+    import search_service
+
+    counted = CountingDatabase(database)
+    reset_matching_state(database)
+
+    # Point the service at the benchmark database and count notifications instead of publishing
+    published = Counter()
+    search_service.db = counted
+    search_service.account_collection = counted.account
+    search_service.matches_collection = counted.matches
+    search_service.search_requests_collection = counted.search_requests
+    search_service.publish_message = lambda queue_name, message: published.update([queue_name]) or True
+    matching_service.send_match_notifications = lambda matches: published.update(["match_notifications"] * len(matches))
+
+    latencies = []
+    total_matches = 0
+    run_start = time.perf_counter()
+    for search_request in sample:
+        start = time.perf_counter()
+        matches = search_service.find_matches(
+            search_request["user_email"],
+            search_request["location"],
+            {"restaurant": search_request.get("restaurant") or {}},
+            str(search_request["_id"])
+        )
+        latencies.append(time.perf_counter() - start)
+        total_matches += len(matches)
+    elapsed = time.perf_counter() - run_start
+
+    return summarize("search_service", population, latencies, total_matches, elapsed, counted.counter,
+                     {"notifications": sum(published.values())})
+
+
+BENCHMARKS = {
+    "matching_service": bench_matching_service,
+    "search_service": bench_search_service,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the matching engines")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Population sizes (number of accounts)")
+    parser.add_argument("--searches", type=int, default=200, help="Searches driven per size")
+    parser.add_argument("--active-fraction", type=float, default=0.2,
+                        help="Share of accounts with an active search request")
+    parser.add_argument("--matchers", nargs="+", choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS))
+    parser.add_argument("--mongo-uri", help="Use a real MongoDB instead of mongomock")
+    parser.add_argument("--database", default="bitebuddies_bench")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file as well as stdout")
+    parser.add_argument("--verbose", action="store_true", help="Keep the services' own log output")
+    args = parser.parse_args()
+
+    database = open_database(args.mongo_uri, args.database)
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "backend": "mongodb" if args.mongo_uri else "mongomock",
+        "proximity_threshold_km": config.PROXIMITY_THRESHOLD_KM,
+        "results": [],
+    }
+
+    for size in args.sizes:
+        accounts, search_requests = generate_population(size, args.active_fraction, seed=args.seed)
+        load_population(database, accounts, search_requests)
+        # The services build their indexes at startup, before any search is matched
+        ensure_indexes(database, ["account", "search_requests", "matches"])
+        rng = random.Random(args.seed)
+        sample = rng.sample(search_requests, min(args.searches, len(search_requests)))
+        print(f"Population {size}: {len(search_requests)} active searchers, driving {len(sample)} searches",
+              file=sys.stderr)
+
+        match_counts = {}
+        for matcher in args.matchers:
+            # The services log every step with print(); keep that out of the report
+            with open(os.devnull, "w") as devnull:
+                with contextlib.redirect_stdout(sys.stderr if args.verbose else devnull):
+                    result = BENCHMARKS[matcher](database, size, sample)
+            print(f"  {matcher}: p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                  f"ops/search={result['mongo_ops_per_search']} matches={result['matches']}", file=sys.stderr)
+            report["results"].append(result)
+            match_counts[matcher] = result["matches"]
+
+        # Both matchers see the same population and searches, so timings are only
+        # comparable if they also found the same matches
+        if len(set(match_counts.values())) > 1:
+            sys.exit(f"Matchers disagree on population {size}: {match_counts}")
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
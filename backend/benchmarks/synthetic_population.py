@@ -0,0 +1,97 @@
+"""
+Synthetic population generator for matching benchmarks.
+
+Creates accounts and active search requests spread around a handful of
+Singapore hotspots, in the same document shapes the account and search
+services write.
+"""
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+# (latitude, longitude) of busy areas; searchers cluster around these
+SG_HOTSPOTS = [
+    (1.2834, 103.8599),  # Marina Bay
+    (1.3048, 103.8320),  # Orchard
+    (1.2839, 103.8431),  # Chinatown
+    (1.3068, 103.8520),  # Little India
+    (1.2997, 103.7894),  # one-north
+    (1.3521, 103.9448),  # Tampines
+    (1.4360, 103.7865),  # Woodlands
+    (1.3329, 103.7436),  # Jurong East
+]
+
+# Roughly how far (in degrees) searchers spread out from a hotspot
+HOTSPOT_SPREAD_DEG = 0.03
+
+SAMPLE_RESTAURANTS = [
+    {"_id": str(ObjectId()), "name": name}
+    for name in ["Pasta Palace", "Sushi Supreme", "Taco Town", "Burger Bistro", "Curry House"]
+]
+
+CUISINES = ["Italian", "Japanese", "Mexican", "American", "Indian", "Chinese", "Thai"]
+
+
+def random_location(rng):
+    lat, lng = rng.choice(SG_HOTSPOTS)
+    return {
+        "lat": round(rng.gauss(lat, HOTSPOT_SPREAD_DEG), 6),
+        "lng": round(rng.gauss(lng, HOTSPOT_SPREAD_DEG), 6),
+    }
+
+
+def generate_population(size, active_fraction=0.2, restaurant_fraction=0.5, ttl_seconds=3600, seed=42):
+    """
+    Build synthetic accounts and active search requests.
+
+    Args:
+        size (int): Number of accounts
+        active_fraction (float): Share of accounts with an active search request
+        restaurant_fraction (float): Share of searches that picked a restaurant
+        ttl_seconds (int): How long the generated search requests stay active
+        seed (int): Random seed so runs are reproducible
+
+    Returns:
+        tuple: (accounts, search_requests) lists of documents
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    accounts = []
+    search_requests = []
+
+    for i in range(size):
+        email = f"user{i}@bench.bitebuddies"
+        location = random_location(rng)
+        accounts.append({
+            "email": email,
+            "name": f"Bench User {i}",
+            "given_name": f"Bench{i}",
+            "preferences": {"cuisine": rng.choice(CUISINES)},
+            "location": {"latitude": location["lat"], "longitude": location["lng"]},
+        })
+
+        if rng.random() < active_fraction:
+            restaurant = rng.choice(SAMPLE_RESTAURANTS) if rng.random() < restaurant_fraction else {}
+            search_requests.append({
+                "_id": ObjectId(),
+                "user_email": email,
+                "location": location,
+                "proximity_threshold_km": 2.0,
+                "restaurant": dict(restaurant),
+                "status": "active",
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=ttl_seconds),
+            })
+
+    return accounts, search_requests
+
+
+def load_population(db, accounts, search_requests):
+    """Replace the benchmark collections with the generated documents"""
+    for name in ("account", "search_requests", "matches"):
+        db[name].delete_many({})
+    if accounts:
+        db.account.insert_many(accounts)
+    if search_requests:
+        db.search_requests.insert_many(search_requests)
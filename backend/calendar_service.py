@@ -15,6 +15,7 @@ import traceback
 # Add parent directory to path for importing config
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import config
+from pagination import paginate, InvalidCursor
 
 # Set up MongoDB connection
 from pymongo import MongoClient
@@ -813,8 +814,14 @@ def get_meetings():
                 ]
             }
             
-        # Get meetings from database
-        meetings = list(db.calendar_events.find(query).sort("created_at", -1))
+        # Get one page of meetings from database, newest first
+        meetings, next_cursor = paginate(
+            db.calendar_events,
+            query,
+            sort=[("created_at", -1)],
+            limit=request.args.get('limit'),
+            cursor=request.args.get('cursor')
+        )
         
         # Convert ObjectIds to strings for JSON serialization
         for meeting in meetings:
@@ -823,8 +830,14 @@ def get_meetings():
                 
         return jsonify({
             "success": True,
-            "data": meetings
+            "data": meetings,
+            "next_cursor": next_cursor
         }), 200
+    except InvalidCursor as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             "success": False,
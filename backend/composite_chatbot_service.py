@@ -207,10 +207,22 @@ def get_meeting(meeting_id):
 def get_user_meetings(email):
     """Get all meetings for a user"""
     try:
-        response = requests.get(
-            f"{MEETING_SERVICE_URL}/get_user_meetings/{email}"
-        )
-        return jsonify(response.json()), response.status_code
+        # The meeting service returns one page at a time; follow X-Next-Cursor to the end
+        meetings = []
+        params = {}
+        while True:
+            response = requests.get(
+                f"{MEETING_SERVICE_URL}/get_user_meetings/{email}",
+                params=params
+            )
+            if not response.ok:
+                return jsonify(response.json()), response.status_code
+            meetings.extend(response.json())
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+            params = {"cursor": next_cursor}
+        return jsonify(meetings), 200
         
     except Exception as e:
         logger.error(f"Error getting user meetings: {str(e)}")
@@ -506,7 +518,7 @@ def transcribe_audio_proxy():
 def get_transcriptions_proxy():
     """Proxy for the transcribe service's transcriptions endpoint"""
     try:
-        response = requests.get(f"{TRANSCRIBE_SERVICE_URL}/transcriptions")
+        response = requests.get(f"{TRANSCRIBE_SERVICE_URL}/transcriptions", params=request.args)
         return jsonify(response.json()), response.status_code
     except Exception as e:
         logger.error(f"Error proxying transcriptions: {str(e)}")
@@ -8,6 +8,8 @@ import sys
 import time
 from datetime import datetime, timedelta
 import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from bson import ObjectId
 import pika
 
@@ -19,6 +21,11 @@ logger = logging.getLogger(__name__)
 # Add parent directory to path for importing config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from geo_distance import haversine_km, distances_from
+from search_state_store import create_search_state_store
+from route_cache import RouteCache
+from travel_time_table import TravelTimeTable
+from db_indexes import ensure_indexes_in_background
 
 # Custom JSON encoder for MongoDB ObjectId and datetime
 class CustomJSONEncoder(json.JSONEncoder):
@@ -55,19 +62,50 @@ ROUTE_API_URL = "https://zsq.outsystemscloud.com/Location/rest/Location/route"
 ORIGIN_LATITUDE = 1.2834
 ORIGIN_LONGITUDE = 103.8599
 
-# In-memory storage for search requests and their results
-# This should be moved to a database in production
-search_requests = {}
+# Shared HTTP client so calls to other services reuse pooled connections
+http = requests.Session()
+http.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=config.COMPOSITE_HTTP_POOL_SIZE))
+http.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=config.COMPOSITE_HTTP_POOL_SIZE))
+
+# Search requests and their results, bounded by size and age. With the mongo
+# backend every replica sees the same searches, so the service can scale out.
+state_db = None
+if config.COMPOSITE_STATE_BACKEND == "mongo" or config.COMPOSITE_ROUTE_CACHE_STORE == "mongo":
+    from pymongo import MongoClient
+    state_db = MongoClient(config.MONGODB_URI)["bitebuddies"]
+    ensure_indexes_in_background(state_db, ["composite_searches", "route_cache"])
+search_requests = create_search_state_store(
+    config.COMPOSITE_STATE_BACKEND,
+    db=state_db,
+    max_entries=config.COMPOSITE_MAX_SEARCHES,
+    ttl_seconds=config.COMPOSITE_SEARCH_TTL_SECONDS
+)
 
 # Polling interval for checking search results
-POLL_INTERVAL = 2  # seconds
+POLL_INTERVAL = 2  # seconds to back off after a failed wait
 SEARCH_TIMEOUT = 20  # seconds
+POLL_SLICE = 10  # longest single wait on the search service before a search yields its worker
+BUSY_POLL_SLICE = 1  # shorter wait used while other searches are queued for a worker
+
+# Every in-flight search is polled by this fixed pool, one wait slice at a time
+poll_executor = ThreadPoolExecutor(max_workers=config.COMPOSITE_POLL_WORKERS, thread_name_prefix="search-poller")
+in_flight_searches = set()
+queued_polls = 0  # polls submitted to poll_executor that have not started yet
+poller_lock = threading.Lock()
+poller_metrics = {
+    "started": 0,
+    "matches_found": 0,
+    "expired": 0,
+    "no_matches": 0,
+    "stopped": 0,
+    "poll_errors": 0
+}
 
 # --- Helper Functions ---
 def get_user_data(user_email):
     """Fetch user data from account service"""
     try:
-        response = requests.get(f"{ACCOUNT_SERVICE_URL}/account/{user_email}")
+        response = http.get(f"{ACCOUNT_SERVICE_URL}/account/{user_email}")
         if response.status_code == 200:
             return response.json()
         else:
@@ -80,9 +118,15 @@ def get_user_data(user_email):
 def get_restaurant_data(restaurant_id):
     """Fetch restaurant data from restaurant service"""
     try:
-        response = requests.get(f"{RESTAURANT_SERVICE_URL}/restaurants/{restaurant_id}")
+        # The restaurant service has no single-id route; ask the batch lookup for one id
+        response = http.post(
+            f"{RESTAURANT_SERVICE_URL}/restaurants/batch",
+            json={"ids": [restaurant_id]},
+            timeout=10
+        )
         if response.status_code == 200:
-            return response.json()
+            restaurants = response.json().get("data", [])
+            return {"code": 200, "data": restaurants[0]} if restaurants else None
         else:
             logger.error(f"Failed to get restaurant data: {response.status_code} - {response.text}")
             return None
@@ -90,49 +134,97 @@ def get_restaurant_data(restaurant_id):
         logger.error(f"Error fetching restaurant data: {str(e)}")
         return None
 
-def poll_search_results(request_id, user_email):
-    """Poll the search service for results and update in-memory storage"""
-    start_time = datetime.now()
-    search_requests[request_id]["status"] = "searching"
-    
-    while (datetime.now() - start_time).total_seconds() < SEARCH_TIMEOUT:
+def start_polling(request_id, user_email):
+    """Hand a new search to the poller pool"""
+    with poller_lock:
+        in_flight_searches.add(request_id)
+        poller_metrics["started"] += 1
+    search_requests.transition(request_id, ["initiated"], {"status": "searching"})
+    submit_poll(request_id, user_email, time.time() + SEARCH_TIMEOUT)
+
+def submit_poll(request_id, user_email, deadline, polls=0):
+    """Queue the next poll of a search on the pool, counting it until a worker picks it up"""
+    global queued_polls
+    with poller_lock:
+        queued_polls += 1
+    poll_executor.submit(poll_search_results, request_id, user_email, deadline, polls)
+
+def finish_polling(request_id, outcome):
+    with poller_lock:
+        in_flight_searches.discard(request_id)
+        poller_metrics[outcome] += 1
+    logger.info(f"Polling complete for {request_id} - {outcome}")
+
+def poll_search_results(request_id, user_email, deadline, polls=0):
+    """
+    Wait one slice for results on the search service, then reschedule until the search finishes.
+    polls counts the slices already done; a search is always checked at least once, even
+    if it sat in the queue past its deadline during a burst.
+    """
+    global queued_polls
+    with poller_lock:
+        queued_polls -= 1
+        backlog = queued_polls
+    try:
+        search_request = search_requests.get(request_id)
+        if search_request is None or search_request["status"] != "searching":
+            # Cancelled or evicted while queued
+            finish_polling(request_id, "stopped")
+            return
+        
+        remaining = deadline - time.time()
+        if remaining <= 0 and polls > 0:
+            search_requests.transition(request_id, ["searching"], {"status": "no_matches"})
+            finish_polling(request_id, "no_matches")
+            return
+        
+        # Only hold a worker for a long wait when no other search is waiting for one
+        wait = max(0, min(remaining, BUSY_POLL_SLICE if backlog > 0 else POLL_SLICE))
         try:
-            url = f"{SEARCH_SERVICE_URL}/api/search/status/{request_id}?user_email={user_email}"
-            response = requests.get(url)
+            # Blocks on the search service until a match arrives, the request expires, or the slice ends
+            response = http.get(
+                f"{SEARCH_SERVICE_URL}/api/search/wait/{request_id}",
+                params={"user_email": user_email, "timeout": wait},
+                timeout=wait + 5
+            )
             
             if response.status_code == 200:
                 data = response.json()
-                
-                # Update the search request data
-                search_requests[request_id].update({
+                search_requests.update(request_id, {
                     "last_polled": datetime.now(),
                     "raw_results": data
                 })
                 
-                # Check if search is complete or matches found
-                if data.get("status") == "completed" or data.get("status") == "expired":
-                    search_requests[request_id]["status"] = data.get("status")
-                    break
+                if data.get("status") == "expired":
+                    search_requests.transition(request_id, ["searching"], {"status": "expired"})
+                    finish_polling(request_id, "expired")
+                    return
                     
                 if data.get("matches") and len(data.get("matches")) > 0:
-                    search_requests[request_id]["status"] = "matches_found"
-                    search_requests[request_id]["matches"] = data.get("matches")
-                    break
+                    search_requests.transition(request_id, ["searching"], {
+                        "status": "matches_found",
+                        "matches": data.get("matches")
+                    })
+                    finish_polling(request_id, "matches_found")
+                    return
             else:
                 logger.error(f"Error polling search results: {response.status_code} - {response.text}")
+                with poller_lock:
+                    poller_metrics["poll_errors"] += 1
+                # Avoid hammering the search service while it is failing
+                time.sleep(min(POLL_INTERVAL, max(remaining - wait, 0)))
                 
         except Exception as e:
             logger.error(f"Exception polling search results: {str(e)}")
-            
-        # Wait before polling again
-        time.sleep(POLL_INTERVAL)
-    
-    # If we exited the loop due to timeout, mark as no_matches
-    if search_requests[request_id]["status"] == "searching":
-        search_requests[request_id]["status"] = "no_matches"
+            with poller_lock:
+                poller_metrics["poll_errors"] += 1
+            time.sleep(min(POLL_INTERVAL, max(deadline - time.time(), 0)))
         
-    logger.info(f"Polling complete for {request_id} - status: {search_requests[request_id]['status']}")
-    return search_requests[request_id]
+        # Back of the queue, so every in-flight search gets a turn
+        submit_poll(request_id, user_email, deadline, polls + 1)
+    except Exception as e:
+        logger.error(f"Poller failed for {request_id}: {str(e)}")
+        finish_polling(request_id, "stopped")
 
 def create_meeting(user_email, match_email, restaurant_name, match_id):
     """Create a meeting between two users"""
@@ -156,7 +248,7 @@ def create_meeting(user_email, match_email, restaurant_name, match_id):
             "accepted_users": [user_email]  # User who initiated is automatically accepted
         }
         
-        response = requests.post(
+        response = http.post(
             f"{MEETING_SERVICE_URL}/create_meeting",
             json=meeting_data
         )
@@ -172,8 +264,8 @@ def create_meeting(user_email, match_email, restaurant_name, match_id):
 
 def calculate_route(restaurant_latitude, restaurant_longitude):
     """
-    Calculate route information between hardcoded origin and restaurant coordinates
-    using the provided Route API.
+    Calculate route information between hardcoded origin and restaurant coordinates,
+    served from the route cache when possible.
     
     Args:
         restaurant_latitude (float): Restaurant's latitude
@@ -182,6 +274,10 @@ def calculate_route(restaurant_latitude, restaurant_longitude):
     Returns:
         dict: Route information including distance and duration, or None if failed
     """
+    return route_cache.get(ORIGIN_LATITUDE, ORIGIN_LONGITUDE, restaurant_latitude, restaurant_longitude)
+
+def fetch_route(origin_latitude, origin_longitude, restaurant_latitude, restaurant_longitude):
+    """Call the Route API for one origin/restaurant pair; used by the route cache on a miss"""
     try:
         logger.info(f"Calculating route to restaurant at ({restaurant_latitude}, {restaurant_longitude})")
         
@@ -201,18 +297,19 @@ def calculate_route(restaurant_latitude, restaurant_longitude):
             "origin": {
                 "location": {
                     "latLng": {
-                        "latitude": ORIGIN_LATITUDE,
-                        "longitude": ORIGIN_LONGITUDE
+                        "latitude": float(origin_latitude),
+                        "longitude": float(origin_longitude)
                     }
                 }
             }
         }
         
         # Make the API request
-        response = requests.post(
+        response = http.post(
             ROUTE_API_URL,
             json=payload,
-            headers={"Content-Type": "application/json"}
+            headers={"Content-Type": "application/json"},
+            timeout=config.COMPOSITE_ROUTE_CALL_TIMEOUT_SECONDS
         )
         
         # Check if the request was successful
@@ -231,6 +328,18 @@ def calculate_route(restaurant_latitude, restaurant_longitude):
         logger.error(f"Error calculating route: {str(e)}")
         return None
 
+# Route API calls for one nearby listing run in parallel on this pool
+route_executor = ThreadPoolExecutor(max_workers=config.COMPOSITE_ROUTE_WORKERS, thread_name_prefix="route-fetch")
+
+# Routes barely change, so serve them from memory, then Mongo, before calling the Route API
+route_cache = RouteCache(
+    fetch_route,
+    collection=state_db.route_cache if config.COMPOSITE_ROUTE_CACHE_STORE == "mongo" else None,
+    max_entries=config.COMPOSITE_ROUTE_CACHE_SIZE,
+    ttl_seconds=config.COMPOSITE_ROUTE_CACHE_TTL_SECONDS,
+    stale_seconds=config.COMPOSITE_ROUTE_CACHE_STALE_SECONDS
+)
+
 def decode_route_response(response_data):
     """
     Decode and extract relevant information from the Route API response.
@@ -323,6 +432,23 @@ def health_check():
         "timestamp": datetime.now().isoformat()
     })
 
+@app.route('/api/composite-search/metrics', methods=['GET'])
+def poller_gauges():
+    """Gauges for the search poller and request table"""
+    with poller_lock:
+        metrics = dict(poller_metrics, in_flight=len(in_flight_searches), queued_polls=queued_polls)
+    metrics.update({
+        "poll_workers": config.COMPOSITE_POLL_WORKERS,
+        "tracked_searches": len(search_requests),
+        "evicted_searches": search_requests.evictions
+    })
+    return jsonify(metrics)
+
+@app.route('/api/route-cache/metrics', methods=['GET'])
+def route_cache_metrics():
+    """Hit/miss counters for the route cache"""
+    return jsonify(route_cache.metrics())
+
 @app.route('/api/composite-search', methods=['POST'])
 def start_search():
     """Start a search for meeting partners"""
@@ -355,7 +481,7 @@ def start_search():
             "restaurant": restaurant
         }
         
-        response = requests.post(
+        response = http.post(
             f"{SEARCH_SERVICE_URL}/api/search",
             json=search_data
         )
@@ -377,7 +503,7 @@ def start_search():
             }), 500
             
         # Store the search request details
-        search_requests[request_id] = {
+        search_requests.create(request_id, {
             "user_email": user_email,
             "location": location,
             "restaurant": restaurant,
@@ -386,14 +512,10 @@ def start_search():
             "last_polled": None,
             "matches": [],
             "raw_results": search_response
-        }
+        })
         
-        # Start polling for results in a separate thread
-        threading.Thread(
-            target=poll_search_results,
-            args=(request_id, user_email),
-            daemon=True
-        ).start()
+        # Start polling for results on the shared poller pool
+        start_polling(request_id, user_email)
         
         return jsonify({
             "code": 200,
@@ -420,13 +542,13 @@ def get_search_status(request_id):
                 "message": "Missing user_email parameter"
             }), 400
             
-        if request_id not in search_requests:
+        search_request = search_requests.get(request_id)
+        if search_request is None:
             return jsonify({
                 "code": 404,
                 "message": "Search request not found"
             }), 404
             
-        search_request = search_requests[request_id]
         
         # Make sure the requester is the same user who initiated the search
         if search_request["user_email"] != user_email:
@@ -511,25 +633,26 @@ def cancel_search():
         request_id = data.get("request_id")
         
         # Check if the search request exists
-        if request_id not in search_requests:
+        search_request = search_requests.get(request_id)
+        if search_request is None:
             return jsonify({
                 "code": 404,
                 "message": "Search request not found"
             }), 404
             
         # Make sure the requester is the same user who initiated the search
-        if search_requests[request_id]["user_email"] != user_email:
+        if search_request["user_email"] != user_email:
             return jsonify({
                 "code": 403,
                 "message": "Unauthorized: you can only cancel your own search requests"
             }), 403
             
         # Update the search request status
-        search_requests[request_id]["status"] = "cancelled"
+        search_requests.update(request_id, {"status": "cancelled"})
         
         # Call the search service to cancel the search
         try:
-            requests.post(
+            http.post(
                 f"{SEARCH_SERVICE_URL}/api/search/cancel/{request_id}",
                 json={"user_email": user_email}
             )
@@ -597,6 +720,126 @@ def get_restaurant_route(restaurant_id):
             "message": f"Server error: {str(e)}"
         }), 500
 
+# Last restaurant list fetched and its ETag, reused while the restaurant service answers 304
+restaurant_list_cache = (None, None)
+
+def fetch_all_restaurants():
+    """Fetch the full restaurant list from the restaurant service, revalidating the last copy by ETag"""
+    global restaurant_list_cache
+    etag, cached = restaurant_list_cache
+    headers = {"If-None-Match": etag} if etag and cached is not None else {}
+    response = http.get(f"{RESTAURANT_SERVICE_URL}/restaurants/all", headers=headers, timeout=30)
+    if response.status_code == 304:
+        return cached
+    restaurants = response.json() if response.status_code == 200 else None
+    if not isinstance(restaurants, list):
+        raise ValueError(f"Failed to fetch restaurants: {response.status_code}")
+    restaurant_list_cache = (response.headers.get("ETag"), restaurants)
+    return restaurants
+
+def describe_route(restaurant, route_info, straight_line_km):
+    """Return a copy of restaurant with distance, duration and route fields for the nearby listing"""
+    restaurant = dict(restaurant)
+    
+    # If route calculation failed or timed out, use the straight-line distance as fallback
+    if not route_info or not route_info.get("route_found"):
+        restaurant["distance"] = {"kilometers": round(straight_line_km, 2)}
+        restaurant["route"] = None
+    else:
+        # Add route information
+        restaurant["distance"] = route_info["distance"]
+        restaurant["duration"] = route_info["duration"]
+        restaurant["route"] = route_info
+    
+    # Format distance for display
+    restaurant["formattedDistance"] = f"{restaurant['distance']['kilometers']} km"
+    
+    # Add duration formatted if available
+    if "duration" in restaurant and "formatted" in restaurant["duration"]:
+        restaurant["formattedDuration"] = restaurant["duration"]["formatted"]
+    return restaurant
+
+def route_restaurant(restaurant, lat, lng):
+    """Route one restaurant from the origin; used by the travel time table"""
+    return describe_route(
+        restaurant,
+        calculate_route(lat, lng),
+        calculate_straight_line_distance(ORIGIN_LATITUDE, ORIGIN_LONGITUDE, lat, lng)
+    )
+
+def unrouted_restaurant(restaurant, lat, lng):
+    """Straight-line entry for a restaurant that could not be routed; used by the travel time table"""
+    return describe_route(restaurant, None, calculate_straight_line_distance(ORIGIN_LATITUDE, ORIGIN_LONGITUDE, lat, lng))
+
+# Travel distance/time from the origin to every restaurant, refreshed in the background
+travel_time_table = TravelTimeTable(
+    fetch_all_restaurants,
+    route_restaurant,
+    route_executor,
+    refresh_interval=config.COMPOSITE_TRAVEL_TABLE_REFRESH_SECONDS,
+    max_route_age=config.COMPOSITE_ROUTE_CACHE_TTL_SECONDS,
+    fallback=unrouted_restaurant,
+    retry_interval=config.COMPOSITE_TRAVEL_TABLE_RETRY_SECONDS
+)
+
+def nearby_restaurants_live(radius_km):
+    """Route nearby restaurants on request; used until the travel time table is ready"""
+    all_restaurants = fetch_all_restaurants()
+    
+    # Road distance is never shorter than straight-line distance, so anything
+    # whose straight-line distance exceeds the radius can be dropped before routing
+    located_restaurants = []
+    for restaurant in all_restaurants:
+        # Skip restaurants without coordinates
+        if not restaurant.get("latitude") or not restaurant.get("longitude"):
+            continue
+        try:
+            located_restaurants.append((restaurant, float(restaurant["latitude"]), float(restaurant["longitude"])))
+        except (TypeError, ValueError):
+            continue
+    
+    candidates = []
+    if located_restaurants:
+        distances, within = distances_from(
+            ORIGIN_LATITUDE,
+            ORIGIN_LONGITUDE,
+            [lat for _, lat, _ in located_restaurants],
+            [lng for _, _, lng in located_restaurants],
+            radius_km
+        )
+        candidates = [
+            (restaurant, lat, lng, float(distance))
+            for (restaurant, lat, lng), distance, inside in zip(located_restaurants, distances, within)
+            if inside
+        ]
+    
+    # Resolve routes for the survivors concurrently, bounded by the pool and a total deadline
+    futures = {
+        route_executor.submit(calculate_route, lat, lng): restaurant
+        for restaurant, lat, lng, _ in candidates
+    }
+    done, not_done = wait(futures, timeout=config.COMPOSITE_NEARBY_DEADLINE_SECONDS)
+    for future in not_done:
+        future.cancel()
+    if not_done:
+        logger.warning(f"Nearby routes deadline hit: {len(not_done)} of {len(futures)} routes unresolved")
+    
+    restaurants_with_routes = []
+    for future, (restaurant, lat, lng, straight_line_km) in zip(futures, candidates):
+        route_info = future.result() if future in done else None
+        restaurant = describe_route(restaurant, route_info, straight_line_km)
+        
+        # Include only if within radius
+        if restaurant["distance"]["kilometers"] <= radius_km:
+            restaurants_with_routes.append(restaurant)
+    
+    # Sort by travel time if available, otherwise by distance
+    restaurants_with_routes.sort(
+        key=lambda r: r.get("duration", {}).get("seconds", float("inf")) 
+            if r.get("duration") else float("inf")
+    )
+    return restaurants_with_routes, bool(not_done)
+
 @app.route('/api/composite-restaurants/nearby', methods=['POST'])
 def get_nearby_restaurants_with_routes():
     """Get nearby restaurants with route information from the origin point"""
@@ -609,74 +852,19 @@ def get_nearby_restaurants_with_routes():
             
         radius_km = data.get("radius_km", 2.0)  # Default radius of 2km
         
-        # First, get all restaurants from the restaurant service
-        try:
-            response = requests.get(f"{RESTAURANT_SERVICE_URL}/restaurants/all")
-            
-            if response.status_code != 200 or not isinstance(response.json(), list):
+        if travel_time_table.ready():
+            # Served from the precomputed table: a filter over memory, no outbound calls
+            restaurants_with_routes = travel_time_table.nearby(radius_km)
+            partial = False
+        else:
+            try:
+                restaurants_with_routes, partial = nearby_restaurants_live(radius_km)
+            except Exception as e:
+                logger.error(f"Error fetching restaurants: {str(e)}")
                 return jsonify({
                     "code": 500,
-                    "message": "Failed to fetch restaurants"
+                    "message": f"Error fetching restaurants: {str(e)}"
                 }), 500
-                
-            all_restaurants = response.json()
-            
-        except Exception as e:
-            logger.error(f"Error fetching restaurants: {str(e)}")
-            return jsonify({
-                "code": 500,
-                "message": f"Error fetching restaurants: {str(e)}"
-            }), 500
-            
-        # Process each restaurant to add route information
-        restaurants_with_routes = []
-        
-        for restaurant in all_restaurants:
-            # Skip restaurants without coordinates
-            if not restaurant.get("latitude") or not restaurant.get("longitude"):
-                continue
-                
-            # Calculate route
-            route_info = calculate_route(
-                restaurant["latitude"],
-                restaurant["longitude"]
-            )
-            
-            # If route calculation failed, use a straight-line distance as fallback
-            if not route_info or not route_info.get("route_found"):
-                # Calculate straight-line distance (simplified)
-                restaurant["distance"] = {
-                    "kilometers": round(
-                        calculate_straight_line_distance(
-                            ORIGIN_LATITUDE, ORIGIN_LONGITUDE, 
-                            float(restaurant["latitude"]), float(restaurant["longitude"])
-                        ),
-                        2
-                    )
-                }
-                restaurant["route"] = None
-            else:
-                # Add route information
-                restaurant["distance"] = route_info["distance"]
-                restaurant["duration"] = route_info["duration"]
-                restaurant["route"] = route_info
-            
-            # Include only if within radius
-            if restaurant["distance"]["kilometers"] <= radius_km:
-                # Format distance for display
-                restaurant["formattedDistance"] = f"{restaurant['distance']['kilometers']} km"
-                
-                # Add duration formatted if available
-                if "duration" in restaurant and "formatted" in restaurant["duration"]:
-                    restaurant["formattedDuration"] = restaurant["duration"]["formatted"]
-                
-                restaurants_with_routes.append(restaurant)
-                
-        # Sort by travel time if available, otherwise by distance
-        restaurants_with_routes.sort(
-            key=lambda r: r.get("duration", {}).get("seconds", float("inf")) 
-                if r.get("duration") else float("inf")
-        )
         
         return jsonify({
             "code": 200,
@@ -686,7 +874,8 @@ def get_nearby_restaurants_with_routes():
                 "latitude": ORIGIN_LATITUDE,
                 "longitude": ORIGIN_LONGITUDE
             },
-            "radius_km": radius_km
+            "radius_km": radius_km,
+            "partial": partial
         })
         
     except Exception as e:
@@ -696,49 +885,18 @@ def get_nearby_restaurants_with_routes():
             "message": f"Server error: {str(e)}"
         }), 500
 
+@app.route('/api/composite-restaurants/travel-times/metrics', methods=['GET'])
+def travel_time_table_metrics():
+    """Refresh counters for the travel time table"""
+    return jsonify(dict(travel_time_table.stats, ready=travel_time_table.ready()))
+
 def calculate_straight_line_distance(lat1, lon1, lat2, lon2):
     """Calculate straight-line distance between two points in kilometers"""
-    import math
-    
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    r = 6371  # Radius of Earth in kilometers
-    
-    return c * r
-
-# Cleanup task for old search requests
-def cleanup_old_requests():
-    """Clean up old search requests to avoid memory leaks"""
-    while True:
-        try:
-            current_time = datetime.now()
-            keys_to_remove = []
-            
-            for request_id, request_data in search_requests.items():
-                # Keep requests for 1 hour
-                if (current_time - request_data["created_at"]).total_seconds() > 3600:
-                    keys_to_remove.append(request_id)
-                    
-            for key in keys_to_remove:
-                search_requests.pop(key, None)
-                
-            logger.info(f"Cleaned up {len(keys_to_remove)} old search requests")
-            
-        except Exception as e:
-            logger.error(f"Error in cleanup task: {str(e)}")
-            
-        # Run every hour
-        time.sleep(3600)
+    return haversine_km(lat1, lon1, lat2, lon2)
 
-# Start the cleanup task
-cleanup_thread = threading.Thread(target=cleanup_old_requests, daemon=True)
-cleanup_thread.start()
+# Start the travel time table once everything it calls is defined
+if config.COMPOSITE_TRAVEL_TABLE_REFRESH_SECONDS > 0:
+    travel_time_table.start()
 
 if __name__ == "__main__":
     # Start the Flask app
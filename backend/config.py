@@ -21,6 +21,7 @@ RABBITMQ_HEARTBEAT = 60
 # RabbitMQ Queue Names
 SEARCH_REQUEST_QUEUE = "search_request_queue"
 MATCH_NOTIFICATION_QUEUE = "match_notification_queue"
+ACCOUNT_UPDATED_QUEUE = "account_updated_queue"  # Published by account_service when a profile changes
 
 # Flask Server Configurations
 API_GATEWAY_PORT = 5000
@@ -32,10 +33,50 @@ RATING_SERVICE_PORT = 5005
 MATCH_RESPONSE_PORT = 5006
 COMPOSITE_SEARCH_SERVICE_PORT = 5015
 
+# Composite Search Service
+COMPOSITE_POLL_WORKERS = int(os.getenv("COMPOSITE_POLL_WORKERS", "32"))  # Threads shared by all in-flight searches
+COMPOSITE_HTTP_POOL_SIZE = int(os.getenv("COMPOSITE_HTTP_POOL_SIZE", "64"))  # Pooled connections per downstream host
+COMPOSITE_MAX_SEARCHES = int(os.getenv("COMPOSITE_MAX_SEARCHES", "10000"))  # Searches kept before the oldest are evicted
+COMPOSITE_SEARCH_TTL_SECONDS = int(os.getenv("COMPOSITE_SEARCH_TTL_SECONDS", "3600"))
+COMPOSITE_STATE_BACKEND = os.getenv("COMPOSITE_STATE_BACKEND", "memory")  # "memory" (single process) or "mongo" (shared by replicas)
+
+# Composite route cache (routes from the fixed origin to restaurants)
+COMPOSITE_ROUTE_CACHE_STORE = os.getenv("COMPOSITE_ROUTE_CACHE_STORE", "mongo")  # "mongo" (shared second tier) or "memory"
+COMPOSITE_ROUTE_CACHE_SIZE = int(os.getenv("COMPOSITE_ROUTE_CACHE_SIZE", "2048"))
+COMPOSITE_ROUTE_CACHE_TTL_SECONDS = int(os.getenv("COMPOSITE_ROUTE_CACHE_TTL_SECONDS", "86400"))  # Served as fresh
+COMPOSITE_ROUTE_CACHE_STALE_SECONDS = int(os.getenv("COMPOSITE_ROUTE_CACHE_STALE_SECONDS", str(7 * 86400)))  # Then served while refreshing
+COMPOSITE_ROUTE_WORKERS = int(os.getenv("COMPOSITE_ROUTE_WORKERS", "8"))  # Parallel Route API calls
+COMPOSITE_ROUTE_CALL_TIMEOUT_SECONDS = float(os.getenv("COMPOSITE_ROUTE_CALL_TIMEOUT_SECONDS", "5"))
+COMPOSITE_NEARBY_DEADLINE_SECONDS = float(os.getenv("COMPOSITE_NEARBY_DEADLINE_SECONDS", "8"))  # Total budget for routing one nearby listing
+COMPOSITE_TRAVEL_TABLE_REFRESH_SECONDS = int(os.getenv("COMPOSITE_TRAVEL_TABLE_REFRESH_SECONDS", "300"))  # 0 disables the precomputed table
+COMPOSITE_TRAVEL_TABLE_RETRY_SECONDS = int(os.getenv("COMPOSITE_TRAVEL_TABLE_RETRY_SECONDS", "1800"))  # Wait before re-routing a restaurant whose route failed
+
+# Restaurant Service
+RESTAURANT_NEARBY_MAX_RESULTS = int(os.getenv("RESTAURANT_NEARBY_MAX_RESULTS", "200"))  # Upper bound on /restaurants/nearby's limit
+RESTAURANT_BATCH_MAX_ITEMS = int(os.getenv("RESTAURANT_BATCH_MAX_ITEMS", "500"))  # Most ids + names one /restaurants/batch call may ask for
+RESTAURANT_KNN_DEFAULT_K = int(os.getenv("RESTAURANT_KNN_DEFAULT_K", "10"))
+RESTAURANT_KNN_MAX_K = int(os.getenv("RESTAURANT_KNN_MAX_K", "50"))  # Upper bound on /restaurants/knn's k
+RESTAURANT_CATALOGUE_REFRESH_SECONDS = int(os.getenv("RESTAURANT_CATALOGUE_REFRESH_SECONDS", "60"))  # Catalogue reload interval when change streams are unavailable
+
 # WebSocket Notification Server
 WEBSOCKET_SERVER_HOST = "localhost"
 WEBSOCKET_SERVER_PORT = 8765
 
+# Matching Service Consumer Pool
+MATCHING_WORKERS = int(os.getenv("MATCHING_WORKERS", "4"))
+MATCHING_PREFETCH = int(os.getenv("MATCHING_PREFETCH", "1"))
+
+# Matching mode: "incremental" matches each request as it arrives; "batch" pairs
+# all requests collected over a short window in one distance-ranked pass
+MATCHING_MODE = os.getenv("MATCHING_MODE", "incremental")
+MATCHING_BATCH_WINDOW_MS = int(os.getenv("MATCHING_BATCH_WINDOW_MS", "500"))
+MATCHING_BATCH_MAX_SIZE = int(os.getenv("MATCHING_BATCH_MAX_SIZE", "500"))
+
 # Matching Parameters
 PROXIMITY_THRESHOLD_KM = 2.0  # Standard proximity threshold (2km) for production use
-# For testing purposes, can be increased to facilitate matches (e.g., 15000.0 for global matching) 
\ No newline at end of file
+# For testing purposes, can be increased to facilitate matches (e.g., 15000.0 for global matching) 
+
+# Search Status
+ACCOUNT_CACHE_TTL_SECONDS = int(os.getenv("ACCOUNT_CACHE_TTL_SECONDS", "30"))  # How long status polls reuse a looked-up name/preferences
+SEARCH_WAIT_MAX_SECONDS = 25  # Longest a /api/search/wait request may block
+SEARCH_WAIT_RECHECK_SECONDS = 5  # Recheck interval for waiting requests when change streams are unavailable
@@ -0,0 +1,193 @@
+import queue
+import threading
+import time
+import traceback
+
+import pika
+
+
+class ConfirmedPublisher:
+    """
+    Long-lived RabbitMQ publisher that only forgets a message once the broker
+    has accepted it.
+
+    pika connections are not thread-safe, so a single background thread owns
+    the connection. Callers hand messages to publish(), which only enqueues.
+    The thread takes up to batch_size queued messages at a time, publishes
+    them inside an AMQP transaction and commits once, so the whole batch costs
+    a single broker round trip. (A BlockingConnection channel in confirm mode
+    waits for every message's confirm in turn; the commit gives the same
+    guarantee for the batch as a whole.) If the commit fails, none of the batch
+    was delivered and all of it is retried, before anything queued after it,
+    on a fresh connection after an exponential backoff. A message that fails
+    max_attempts times is logged and dropped.
+
+    At most max_pending messages wait in memory. While the broker is down
+    and the queue is full, publish() logs and drops the new message rather
+    than letting memory grow or blocking the caller.
+    """
+
+    def __init__(self, queue_name, connection_factory, max_pending=10000, batch_size=100,
+                 max_attempts=5, max_backoff=30, metrics_interval=60):
+        self.queue_name = queue_name
+        self.connection_factory = connection_factory
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.metrics_interval = metrics_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._retry = []
+        self._connection = None
+        self._channel = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._latency_total = 0.0
+        self._last_metrics_log = time.time()
+        self.stats = {
+            "published": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "publish_failures": 0,
+            "dropped": 0,
+            "retries_exhausted": 0,
+            "reconnects": 0,
+            "last_publish_latency_ms": 0.0,
+            "avg_publish_latency_ms": 0.0
+        }
+
+    def publish(self, body):
+        """Queue a message for confirmed delivery; never blocks. Returns False if it was dropped"""
+        self.start()
+        try:
+            self._queue.put_nowait({"body": body, "enqueued_at": time.time(), "attempts": 0})
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+                dropped = self.stats["dropped"]
+            print(f"Publisher queue for {self.queue_name} is full ({self._queue.maxsize} pending), "
+                  f"dropping message ({dropped} dropped so far): {str(body)[:200]}")
+            return False
+        return True
+
+    def metrics(self):
+        """Return publish counters plus the number of messages not yet confirmed"""
+        return dict(
+            self.stats,
+            unconfirmed=self._queue.qsize() + len(self._retry),
+            max_pending=self._queue.maxsize,
+            batch_size=self.batch_size
+        )
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return self
+
+    def _connect(self):
+        self._connection = self.connection_factory()
+        self._channel = self._connection.channel()
+        self._channel.queue_declare(queue=self.queue_name, durable=True)
+        self._channel.tx_select()
+        self.stats["reconnects"] += 1
+        print(f"Publisher connected to RabbitMQ queue {self.queue_name}")
+
+    def _disconnect(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+
+    def _next_batch(self):
+        if self._retry:
+            batch, self._retry = self._retry, []
+            return batch
+        try:
+            batch = [self._queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _publish_batch(self, batch):
+        try:
+            for message in batch:
+                self._channel.basic_publish(
+                    exchange='',
+                    routing_key=self.queue_name,
+                    body=message["body"],
+                    properties=pika.BasicProperties(
+                        delivery_mode=2,  # make message persistent
+                        content_type='application/json'
+                    )
+                )
+            # Returns once the broker has taken the whole batch; raises if it did not
+            self._channel.tx_commit()
+        except Exception as e:
+            print(f"Error publishing {len(batch)} messages to {self.queue_name}: {str(e)}")
+            self.stats["publish_failures"] += 1
+            for message in batch:
+                message["attempts"] += 1
+                if message["attempts"] >= self.max_attempts:
+                    self.stats["retries_exhausted"] += 1
+                    print(f"Giving up on message for {self.queue_name} after {message['attempts']} attempts: "
+                          f"{str(message['body'])[:200]}")
+                else:
+                    self._retry.append(message)
+            return False
+
+        now = time.time()
+        for message in batch:
+            latency_ms = (now - message["enqueued_at"]) * 1000
+            self.stats["published"] += 1
+            self._latency_total += latency_ms
+            self.stats["last_publish_latency_ms"] = round(latency_ms, 2)
+        self.stats["avg_publish_latency_ms"] = round(self._latency_total / self.stats["published"], 2)
+        self.stats["batches"] += 1
+        self.stats["last_batch_size"] = len(batch)
+        return True
+
+    def _log_metrics(self):
+        if time.time() - self._last_metrics_log >= self.metrics_interval:
+            self._last_metrics_log = time.time()
+            print(f"Publisher metrics for {self.queue_name}: {self.metrics()}")
+
+    def _run(self):
+        backoff = 1
+        while True:
+            try:
+                if self._channel is None or not self._channel.is_open:
+                    self._disconnect()
+                    self._connect()
+
+                batch = self._next_batch()
+                if batch:
+                    if self._publish_batch(batch):
+                        backoff = 1
+                    else:
+                        # Back off before reconnecting, so a broker that keeps
+                        # refusing the batch is not hammered with it
+                        self._disconnect()
+                        if self._retry:
+                            print(f"Retrying {len(self._retry)} messages for {self.queue_name} in {backoff}s")
+                        time.sleep(backoff)
+                        backoff = min(backoff * 2, self.max_backoff)
+                else:
+                    # Service heartbeats while idle
+                    self._connection.process_data_events(time_limit=0)
+
+                self._log_metrics()
+            except Exception as e:
+                print(f"Publisher connection error: {str(e)}; retrying in {backoff}s")
+                traceback.print_exc()
+                self._disconnect()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
@@ -0,0 +1,272 @@
+"""
+Shared MongoDB index declarations.
+
+Every service calls ensure_indexes_in_background() for the collections it owns
+when it starts, and the same declarations can be applied or inspected by hand:
+
+    python db_indexes.py --uri mongodb://localhost:27017            # create/reconcile all indexes
+    python db_indexes.py --uri mongodb://localhost:27017 --status   # report indexes and builds in progress
+
+Indexes are matched by name. A declared index that is missing is created, and
+a TTL change is applied in place with collMod. An index whose keys or other
+options changed is only reported as outdated when a service starts, so
+replicas starting together never drop an index under live traffic; the CLI
+rebuilds it, building a temporary copy first so the collection is never left
+without it. Indexes that are not declared here are reported but never dropped.
+"""
+import argparse
+import os
+import threading
+import traceback
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel, MongoClient
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Expired search requests are kept for a day so clients can still read their final status
+SEARCH_REQUEST_TTL_SECONDS = int(os.getenv("SEARCH_REQUEST_TTL_SECONDS", str(24 * 3600)))
+# Expired matches are kept for a week before they age out
+EXPIRED_MATCH_TTL_SECONDS = int(os.getenv("EXPIRED_MATCH_TTL_SECONDS", str(7 * 24 * 3600)))
+# Composite search state lives as long as the composite service keeps it in memory
+COMPOSITE_SEARCH_TTL_SECONDS = int(os.getenv("COMPOSITE_SEARCH_TTL_SECONDS", "3600"))
+# Cached routes are dropped once they are too old to be served even as stale
+ROUTE_CACHE_EXPIRE_SECONDS = (int(os.getenv("COMPOSITE_ROUTE_CACHE_TTL_SECONDS", "86400"))
+                              + int(os.getenv("COMPOSITE_ROUTE_CACHE_STALE_SECONDS", str(7 * 86400))))
+
+# Index declarations per collection
+INDEXES = {
+    "account": [
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+    "search_requests": [
+        IndexModel([("status", ASCENDING), ("expires_at", ASCENDING), ("user_email", ASCENDING)],
+                   name="status_expires_user"),
+        IndexModel([("user_email", ASCENDING), ("status", ASCENDING)], name="user_status"),
+        # TTL: documents are deleted SEARCH_REQUEST_TTL_SECONDS after expires_at
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl",
+                   expireAfterSeconds=SEARCH_REQUEST_TTL_SECONDS),
+    ],
+    "matches": [
+        IndexModel([("user_email", ASCENDING), ("status", ASCENDING)], name="user_status"),
+        IndexModel([("match_email", ASCENDING), ("status", ASCENDING)], name="match_status"),
+        IndexModel([("search_request_id", ASCENDING), ("status", ASCENDING)], name="search_request_status"),
+        # Unique among pending matches so concurrent workers cannot double-insert a pair
+        IndexModel([("pair_key", ASCENDING), ("user_email", ASCENDING)], name="pending_pair_unique",
+                   unique=True,
+                   partialFilterExpression={"status": "pending", "pair_key": {"$exists": True}}),
+        # TTL: expired matches are deleted EXPIRED_MATCH_TTL_SECONDS after they were created
+        IndexModel([("created_at", ASCENDING)], name="expired_created_at_ttl",
+                   expireAfterSeconds=EXPIRED_MATCH_TTL_SECONDS,
+                   partialFilterExpression={"status": "expired"}),
+    ],
+    "composite_searches": [
+        # TTL: shared composite search state is deleted COMPOSITE_SEARCH_TTL_SECONDS after it was stored
+        IndexModel([("stored_at", ASCENDING)], name="stored_at_ttl",
+                   expireAfterSeconds=COMPOSITE_SEARCH_TTL_SECONDS),
+    ],
+    "route_cache": [
+        IndexModel([("fetched_at", ASCENDING)], name="fetched_at_ttl",
+                   expireAfterSeconds=ROUTE_CACHE_EXPIRE_SECONDS),
+    ],
+    "availability_log": [
+        IndexModel([("user_email", ASCENDING), ("date", ASCENDING), ("restaurant", ASCENDING),
+                    ("status", ASCENDING), ("start_time", ASCENDING)], name="user_date_restaurant_status_start"),
+        IndexModel([("date", ASCENDING), ("restaurant", ASCENDING), ("status", ASCENDING),
+                    ("start_time", ASCENDING)], name="date_restaurant_status_start"),
+    ],
+    "notifications": [
+        IndexModel([("recipient_email", ASCENDING), ("datetime", DESCENDING)], name="recipient_datetime"),
+    ],
+    "meetings": [
+        IndexModel([("user1_email", ASCENDING)], name="user1_email"),
+        IndexModel([("user2_email", ASCENDING)], name="user2_email"),
+        IndexModel([("match_id", ASCENDING)], name="match_id"),
+    ],
+    "restaurants": [
+        IndexModel([("name", ASCENDING)], name="name"),
+        IndexModel([("region", ASCENDING)], name="region"),
+        # GeoJSON point used by $geoNear in /restaurants/nearby
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+    ],
+}
+
+# Database each collection lives in, used by the CLI
+DATABASES = {
+    "account": "bitebuddies",
+    "search_requests": "bitebuddies",
+    "matches": "bitebuddies",
+    "composite_searches": "bitebuddies",
+    "route_cache": "bitebuddies",
+    "availability_log": "availability_log",
+    "notifications": "notification_db",
+    "meetings": "meeting_db",
+    "restaurants": "restaurant_db",
+}
+
+# Options that change an index's behaviour; anything else in index_information() is ignored
+COMPARED_OPTIONS = ("unique", "expireAfterSeconds", "partialFilterExpression", "sparse")
+
+
+def _differences(declared, existing):
+    """Return the option names that differ between a declared IndexModel and an existing index"""
+    spec = declared.document
+    if [tuple(key) for key in existing["key"]] != [(field, direction) for field, direction in spec["key"].items()]:
+        return ["key"]
+    return [option for option in COMPARED_OPTIONS if spec.get(option) != existing.get(option)]
+
+
+def _rebuild(collection, declared):
+    """
+    Replace an index whose definition changed. A copy under a temporary name is
+    built first so queries keep an index while the declared one is rebuilt;
+    MongoDB refuses the copy when only options like unique differ on the same
+    keys, and then the index is simply dropped and rebuilt.
+    """
+    spec = declared.document
+    name = spec["name"]
+    temporary_name = f"{name}_rebuild"
+    options = {option: value for option, value in spec.items() if option not in ("key", "name")}
+    try:
+        collection.create_indexes([IndexModel(list(spec["key"].items()), name=temporary_name, **options)])
+        covered = True
+    except OperationFailure as e:
+        print(f"Could not build {temporary_name} alongside {name}: {str(e)}")
+        covered = False
+    collection.drop_index(name)
+    collection.create_indexes([declared])
+    if covered:
+        collection.drop_index(temporary_name)
+
+
+def ensure_indexes(db, collections=None, rebuild=False):
+    """
+    Create or reconcile the declared indexes on db.
+
+    Args:
+        db: pymongo Database
+        collections (list): Collection names to reconcile; defaults to all declared collections
+        rebuild (bool): Rebuild indexes whose keys or options changed; otherwise they
+            are only reported. Services leave this off; the CLI turns it on.
+
+    Returns:
+        dict: {collection: {index_name: status}} where status is "exists", "created",
+        "updated", "outdated: ...", "rebuilt", "undeclared" or an error message
+    """
+    report = {}
+    for collection_name in collections or INDEXES:
+        collection = db[collection_name]
+        results = report[collection_name] = {}
+        try:
+            existing = collection.index_information()
+        except PyMongoError as e:
+            results["*"] = f"error: {str(e)}"
+            continue
+
+        for declared in INDEXES.get(collection_name, []):
+            name = declared.document["name"]
+            try:
+                if name not in existing:
+                    collection.create_indexes([declared])
+                    results[name] = "created"
+                    continue
+
+                changed = _differences(declared, existing[name])
+                if not changed:
+                    results[name] = "exists"
+                elif changed == ["expireAfterSeconds"] and "expireAfterSeconds" in existing[name]:
+                    db.command("collMod", collection_name, index={
+                        "name": name,
+                        "expireAfterSeconds": declared.document["expireAfterSeconds"]
+                    })
+                    results[name] = "updated"
+                elif rebuild:
+                    _rebuild(collection, declared)
+                    results[name] = "rebuilt"
+                else:
+                    results[name] = f"outdated: {', '.join(changed)} changed; run db_indexes.py to rebuild"
+            except PyMongoError as e:
+                # One bad index (e.g. a unique one blocked by existing duplicates) must not
+                # stop the others or the service; it is reported and left for the CLI
+                print(f"Could not build index {collection_name}.{name}, skipping: {str(e)}")
+                results[name] = f"error: {str(e)}"
+
+        declared_names = {declared.document["name"] for declared in INDEXES.get(collection_name, [])}
+        for name in existing:
+            if name != "_id_" and name not in declared_names:
+                results[name] = "undeclared"
+    return report
+
+
+def ensure_indexes_in_background(db, collections=None):
+    """Run ensure_indexes on a daemon thread so service startup is not held up by index builds"""
+    def run():
+        try:
+            report = ensure_indexes(db, collections)
+            print(f"Index bootstrap for {db.name}: {report}")
+        except Exception as e:
+            print(f"Index bootstrap for {db.name} failed: {str(e)}")
+            traceback.print_exc()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def index_status(client, collections=None):
+    """Report existing indexes per collection plus any index builds currently running"""
+    status = {"collections": {}, "builds_in_progress": []}
+    for collection_name in collections or INDEXES:
+        collection = client[DATABASES[collection_name]][collection_name]
+        declared = {declared.document["name"] for declared in INDEXES[collection_name]}
+        try:
+            existing = collection.index_information()
+        except PyMongoError as e:
+            status["collections"][collection_name] = {"error": str(e)}
+            continue
+        status["collections"][collection_name] = {
+            "database": DATABASES[collection_name],
+            "present": sorted(existing),
+            "missing": sorted(declared - set(existing)),
+        }
+
+    try:
+        current = client.admin.command("currentOp", {"$or": [
+            {"command.createIndexes": {"$exists": True}},
+            {"msg": {"$regex": "^Index Build"}},
+        ]})
+        for op in current.get("inprog", []):
+            status["builds_in_progress"].append({
+                "namespace": op.get("ns"),
+                "message": op.get("msg"),
+                "progress": op.get("progress"),
+                "seconds_running": op.get("secs_running"),
+            })
+    except PyMongoError as e:
+        # currentOp needs extra privileges on shared clusters
+        status["builds_in_progress"] = f"unavailable: {str(e)}"
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, reconcile or inspect BiteBuddies MongoDB indexes")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI"), help="MongoDB connection string")
+    parser.add_argument("--collections", nargs="+", choices=sorted(INDEXES), help="Only these collections")
+    parser.add_argument("--status", action="store_true", help="Report index status instead of creating indexes")
+    args = parser.parse_args()
+    if not args.uri:
+        parser.error("--uri or MONGODB_URI is required")
+
+    client = MongoClient(args.uri)
+    if args.status:
+        print(index_status(client, args.collections))
+        return
+
+    collections = args.collections or list(INDEXES)
+    for database_name in sorted({DATABASES[name] for name in collections}):
+        names = [name for name in collections if DATABASES[name] == database_name]
+        for collection_name, results in ensure_indexes(client[database_name], names, rebuild=True).items():
+            for name, result in results.items():
+                print(f"{database_name}.{collection_name} {name}: {result}")
+
+
+if __name__ == "__main__":
+    main()
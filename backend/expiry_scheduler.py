@@ -0,0 +1,148 @@
+import heapq
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateMany
+
+
+class ExpiryScheduler:
+    """
+    Expires search requests (and their pending matches) exactly when they are due.
+
+    Active search requests are kept in a min-heap keyed on expires_at. The
+    scheduler thread sleeps until the earliest deadline (or until a new request
+    is scheduled), then expires everything that is due with one write to
+    search_requests and one bulk write to matches. Idle ticks do no database work.
+    """
+
+    def __init__(self, db, resync_interval=60):
+        self.db = db
+        self.resync_interval = resync_interval
+        self._heap = []
+        self._scheduled = set()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._last_resync = 0
+        self.metrics = {
+            "ticks": 0,
+            "expired_requests_last_tick": 0,
+            "expired_matches_last_tick": 0,
+            "expired_requests_total": 0,
+            "expired_matches_total": 0,
+            "lag_seconds_last_tick": 0.0,
+            "lag_seconds_max": 0.0,
+            "pending": 0
+        }
+
+    def schedule(self, search_request_id, user_email, expires_at):
+        """Register an active search request so it is expired at expires_at"""
+        search_request_id = str(search_request_id)
+        with self._condition:
+            if search_request_id in self._scheduled:
+                return
+            self._scheduled.add(search_request_id)
+            heapq.heappush(self._heap, (expires_at, search_request_id, user_email))
+            self.metrics["pending"] = len(self._heap)
+            # Wake the scheduler in case this deadline is earlier than the current one
+            self._condition.notify()
+
+    def resync(self):
+        """Pick up active search requests that were created outside this process"""
+        active_requests = self.db.search_requests.find(
+            {"status": "active"},
+            {"_id": 1, "user_email": 1, "expires_at": 1}
+        )
+        for req in active_requests:
+            if req.get("expires_at"):
+                self.schedule(req["_id"], req["user_email"], req["expires_at"])
+        self._last_resync = time.time()
+
+    def _pop_due(self, now):
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, search_request_id, user_email = heapq.heappop(self._heap)
+                self._scheduled.discard(search_request_id)
+                due.append((expires_at, search_request_id, user_email))
+            self.metrics["pending"] = len(self._heap)
+        return due
+
+    def run_once(self, now=None):
+        """Expire everything that is due; returns the number of expired search requests"""
+        now = now or datetime.now()
+        due = self._pop_due(now)
+        if not due:
+            return 0
+
+        request_ids = [search_request_id for _, search_request_id, _ in due]
+        emails = list({user_email for _, _, user_email in due})
+
+        search_result = self.db.search_requests.update_many(
+            {"_id": {"$in": [ObjectId(search_request_id) for search_request_id in request_ids]}, "status": "active"},
+            {"$set": {"status": "expired"}}
+        )
+
+        # Users who still have another active search keep their pending matches
+        still_active = set(self.db.search_requests.distinct("user_email", {
+            "user_email": {"$in": emails},
+            "status": "active",
+            "expires_at": {"$gte": now}
+        }))
+        inactive_emails = [email for email in emails if email not in still_active]
+
+        operations = [UpdateMany(
+            {"search_request_id": {"$in": request_ids}, "status": "pending"},
+            {"$set": {"status": "expired"}}
+        )]
+        if inactive_emails:
+            operations.append(UpdateMany(
+                {
+                    "$or": [
+                        {"user_email": {"$in": inactive_emails}},
+                        {"match_email": {"$in": inactive_emails}}
+                    ],
+                    "status": "pending"
+                },
+                {"$set": {"status": "expired"}}
+            ))
+        matches_result = self.db.matches.bulk_write(operations, ordered=False)
+
+        lag = (now - due[0][0]).total_seconds()
+        self.metrics["ticks"] += 1
+        self.metrics["expired_requests_last_tick"] = search_result.modified_count
+        self.metrics["expired_matches_last_tick"] = matches_result.modified_count
+        self.metrics["expired_requests_total"] += search_result.modified_count
+        self.metrics["expired_matches_total"] += matches_result.modified_count
+        self.metrics["lag_seconds_last_tick"] = round(lag, 3)
+        self.metrics["lag_seconds_max"] = round(max(self.metrics["lag_seconds_max"], lag), 3)
+
+        print(f"Expired {search_result.modified_count} search requests and {matches_result.modified_count} matches (lag {lag:.3f}s)")
+        return search_result.modified_count
+
+    def _run(self):
+        while True:
+            try:
+                if time.time() - self._last_resync >= self.resync_interval:
+                    self.resync()
+
+                self.run_once()
+
+                # Sleep until the next deadline, a newly scheduled request, or the next resync
+                with self._condition:
+                    wait = self.resync_interval - (time.time() - self._last_resync)
+                    if self._heap:
+                        wait = min(wait, (self._heap[0][0] - datetime.now()).total_seconds())
+                    self._condition.wait(timeout=max(wait, 0.05))
+            except Exception as e:
+                print(f"Error in expiry scheduler: {str(e)}")
+                traceback.print_exc()
+                time.sleep(1)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
@@ -0,0 +1,75 @@
+import math
+import numpy as np
+
+# Mean radius of the Earth in kilometers
+EARTH_RADIUS_KM = 6371.0
+
+# Length of one degree of latitude on the same sphere, in kilometers
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometers"""
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing every point within
+    radius_km of the given point. Slightly generous so it never drops a hit.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    # Use the latitude furthest from the equator, where a degree of longitude is shortest
+    widest_lat = abs(latitude) + lat_delta
+    if widest_lat >= 89.9:
+        lng_delta = 180.0
+    else:
+        lng_delta = radius_km / (KM_PER_DEGREE * math.cos(math.radians(widest_lat)))
+    return latitude - lat_delta, latitude + lat_delta, longitude - lng_delta, longitude + lng_delta
+
+
+def distances_from(origin_lat, origin_lng, latitudes, longitudes, radius_km=None):
+    """
+    Compute haversine distances from one origin to many candidate points in a
+    single vectorized pass.
+
+    Args:
+        origin_lat (float): Origin latitude
+        origin_lng (float): Origin longitude
+        latitudes (sequence of float): Candidate latitudes
+        longitudes (sequence of float): Candidate longitudes
+        radius_km (float, optional): If given, candidates outside a bounding box
+            around the origin are skipped and reported as infinitely far
+
+    Returns:
+        tuple: (distances, within) where distances is a float array in kilometers
+        and within is a boolean mask of candidates inside radius_km (all True
+        when no radius is given)
+    """
+    lats = np.asarray(latitudes, dtype=np.float64)
+    lngs = np.asarray(longitudes, dtype=np.float64)
+    distances = np.full(lats.shape, np.inf)
+
+    if radius_km is None:
+        candidates = np.ones(lats.shape, dtype=bool)
+    else:
+        min_lat, max_lat, min_lng, max_lng = bounding_box(origin_lat, origin_lng, radius_km)
+        candidates = (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+
+    if candidates.any():
+        lat1 = math.radians(origin_lat)
+        lng1 = math.radians(origin_lng)
+        lat2 = np.radians(lats[candidates])
+        lng2 = np.radians(lngs[candidates])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+        distances[candidates] = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    if radius_km is None:
+        within = np.isfinite(distances)
+    else:
+        within = distances <= radius_km
+    return distances, within
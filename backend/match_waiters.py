@@ -0,0 +1,100 @@
+import threading
+import time
+import traceback
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+
+class MatchWaiters:
+    """
+    Lets request handlers block until a user gets a new match.
+
+    Each user has a version number that is bumped whenever a match involving
+    them is saved. A handler reads the version, checks the database, and if
+    there is nothing new waits for the version to change. Saves are seen
+    through a change stream on matches inserts (so matches written by other
+    matching workers wake waiters too) and through notify() for saves made in
+    this process. Without change streams, waiters fall back to rechecking
+    every fallback_recheck seconds.
+    """
+
+    def __init__(self, db, fallback_recheck=5):
+        self.db = db
+        self.fallback_recheck = fallback_recheck
+        self.push_available = False
+        self._versions = {}
+        self._waiting = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def version(self, user_email):
+        with self._condition:
+            return self._versions.get(user_email, 0)
+
+    def notify(self, user_emails):
+        """Wake everyone waiting on any of these users"""
+        with self._condition:
+            for user_email in user_emails:
+                if user_email:
+                    self._versions[user_email] = self._versions.get(user_email, 0) + 1
+            # Forget users nobody is waiting on; a reset version only causes a harmless early recheck
+            if len(self._versions) > 10000:
+                self._versions = {email: version for email, version in self._versions.items() if email in self._waiting}
+            self._condition.notify_all()
+
+    def wait(self, user_email, since_version, timeout):
+        """Block until user_email's version moves past since_version; returns True if it did"""
+        deadline = time.time() + timeout
+        with self._condition:
+            self._waiting[user_email] = self._waiting.get(user_email, 0) + 1
+            try:
+                while self._versions.get(user_email, 0) == since_version:
+                    remaining = deadline - time.time()
+                    if not self.push_available:
+                        remaining = min(remaining, self.fallback_recheck)
+                    if remaining <= 0:
+                        return False
+                    self._condition.wait(timeout=remaining)
+                    if not self.push_available and time.time() < deadline:
+                        # Coarse recheck: let the caller look at the database again
+                        return False
+                return True
+            finally:
+                self._waiting[user_email] -= 1
+                if not self._waiting[user_email]:
+                    del self._waiting[user_email]
+
+    def _watch(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        backoff = 1
+        while True:
+            try:
+                with self.db.matches.watch(pipeline) as stream:
+                    print("Watching matches change stream for new matches...")
+                    self.push_available = True
+                    backoff = 1
+                    for change in stream:
+                        match = change.get("fullDocument") or {}
+                        self.notify([match.get("user_email"), match.get("match_email")])
+            except OperationFailure as e:
+                self.push_available = False
+                # 40573: change streams need a replica set
+                if e.code == 40573:
+                    print("Change streams not supported by this deployment, search waits will recheck periodically")
+                    return
+                print(f"Matches change stream error: {str(e)}; retrying in {backoff}s")
+            except PyMongoError as e:
+                self.push_available = False
+                print(f"Matches change stream error: {str(e)}; retrying in {backoff}s")
+            except Exception as e:
+                self.push_available = False
+                print(f"Error in matches change stream: {str(e)}")
+                traceback.print_exc()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, daemon=True)
+            self._thread.start()
+        return self
@@ -4,11 +4,18 @@ import sys
 import os
 import time
 import traceback
-from pymongo import MongoClient
+import functools
+import queue
+import uuid
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
 from bson import ObjectId
-from geopy.distance import geodesic
 import threading
 from datetime import datetime, timedelta
+from geo_distance import haversine_km
+from spatial_index import SpatialGridIndex
+from confirmed_publisher import ConfirmedPublisher
+from db_indexes import ensure_indexes_in_background
 
 # Add parent directory to path for importing config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -35,30 +42,157 @@ def get_rabbitmq_connection():
 # Function to calculate distance between two points
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
-    Calculate the geographic distance between two points in kilometers
-    using the geopy library.
+    Calculate the great-circle distance between two points in kilometers.
     """
     try:
-        # Create location tuples (latitude, longitude)
-        loc1 = (lat1, lon1)
-        loc2 = (lat2, lon2)
-        
-        # Calculate distance using geodesic 
-        distance = geodesic(loc1, loc2).kilometers
-        
-        return round(distance, 2)
+        return round(haversine_km(float(lat1), float(lon1), float(lat2), float(lon2)), 2)
     except Exception as e:
         print(f"Error calculating distance: {str(e)}")
         return float('inf')  # Return infinite distance on error
 
 
+# In-memory spatial index of active search requests. Every process that
+# matches keeps its own copy and syncs it from search_requests before each
+# search, so requests inserted or matched by other processes are always seen.
+active_index = SpatialGridIndex(cell_km=config.PROXIMITY_THRESHOLD_KM)
+_index_seeded = False
+_index_seed_lock = threading.Lock()
+# Newest search request _id the index has loaded, so later syncs only read newer ones
+_index_last_id = None
+# ObjectIds from different clients are only ordered to the second, so syncs
+# re-read this far behind the newest _id to catch requests that sorted below it
+INDEX_SYNC_OVERLAP_SECONDS = 5
+# Load order, which becomes sequence order in the index: the request inserted
+# later must be the one that evaluates the pair
+INDEX_LOAD_ORDER = [("created_at", 1), ("_id", 1)]
+
+# Function to normalize a location dict into a (latitude, longitude) tuple
+def normalize_location(location):
+    """Accept both lat/lng and latitude/longitude keys; return None if invalid."""
+    if not location:
+        return None
+    try:
+        lat = location.get("latitude", location.get("lat"))
+        lng = location.get("longitude", location.get("lng"))
+        if lat is None or lng is None:
+            return None
+        return float(lat), float(lng)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+# Function to build an index entry from a search request and its user's account
+def build_index_entry(search_request, account):
+    coordinates = normalize_location(search_request.get("location"))
+    if not coordinates or not account or not account.get("name"):
+        return None
+    restaurant = search_request.get("restaurant") or {}
+    return {
+        "search_request_id": str(search_request["_id"]),
+        "user_email": search_request["user_email"],
+        "user_name": account.get("name"),
+        "preferences": account.get("preferences", {}),
+        "latitude": coordinates[0],
+        "longitude": coordinates[1],
+        "restaurant_id": restaurant.get("_id"),
+        "expires_at": search_request.get("expires_at")
+    }
+
+# Function to load all currently active search requests into the index
+def seed_active_index(db):
+    """Populate the spatial index from the database with one query per collection."""
+    global _index_seeded, _index_last_id
+    with _index_seed_lock:
+        if _index_seeded:
+            return
+        current_time = datetime.now()
+        # Oldest first so sequence numbers follow creation order
+        active_requests = list(db.search_requests.find({
+            "status": "active",
+            "expires_at": {"$gte": current_time}
+        }).sort(INDEX_LOAD_ORDER))
+        emails = list({req["user_email"] for req in active_requests})
+        accounts = {}
+        if emails:
+            for account in db.account.find({"email": {"$in": emails}}, {"email": 1, "name": 1, "preferences": 1}):
+                accounts[account["email"]] = account
+
+        for req in active_requests:
+            entry = build_index_entry(req, accounts.get(req["user_email"]))
+            if entry:
+                active_index.add(entry)
+        if active_requests:
+            _index_last_id = max(req["_id"] for req in active_requests)
+
+        _index_seeded = True
+        print(f"Seeded spatial index with {len(active_index)} active search requests")
+
+# Function to add search requests created since the index last looked (e.g. by other processes)
+def sync_active_index(db):
+    """
+    Load only active search requests newer than the last one the index has
+    seen, less a few seconds of overlap. Entries already in the index are left
+    alone, so their sequence numbers and evaluated watermarks survive.
+
+    Called before every search, this is what lets several matcher processes
+    run side by side: a request is always inserted before it is matched, so of
+    any two requests the one matched later finds the other here.
+    """
+    global _index_last_id
+    if not _index_seeded:
+        seed_active_index(db)
+        return
+    with _index_seed_lock:
+        query = {"status": "active", "expires_at": {"$gte": datetime.now()}}
+        if _index_last_id is not None:
+            since = _index_last_id.generation_time - timedelta(seconds=INDEX_SYNC_OVERLAP_SECONDS)
+            query["_id"] = {"$gt": ObjectId.from_datetime(since)}
+        new_requests = [
+            req for req in db.search_requests.find(query).sort(INDEX_LOAD_ORDER)
+            if active_index.get(str(req["_id"])) is None
+        ]
+        emails = list({req["user_email"] for req in new_requests})
+        accounts = {}
+        if emails:
+            for account in db.account.find({"email": {"$in": emails}}, {"email": 1, "name": 1, "preferences": 1}):
+                accounts[account["email"]] = account
+
+        for req in new_requests:
+            entry = build_index_entry(req, accounts.get(req["user_email"]))
+            if entry:
+                active_index.add(entry)
+            _index_last_id = max(_index_last_id, req["_id"]) if _index_last_id is not None else req["_id"]
+
+# Function to check a searcher's restaurant choice against another searcher
+def restaurant_compatible(searcher, other):
+    """Only include users who selected the same restaurant if the searcher selected one."""
+    return not searcher.get("restaurant_id") or other.get("restaurant_id") == searcher["restaurant_id"]
+
+# Function to build a match record from two index entries
+def build_match(searcher, other, distance, search_request_id, user_preferences=None):
+    return {
+        "user_email": searcher["user_email"],
+        "user_name": searcher["user_name"],
+        "user_preferences": user_preferences if user_preferences is not None else searcher.get("preferences", {}),
+        "match_email": other["user_email"],
+        "match_name": other["user_name"],
+        "match_preferences": other.get("preferences", {}),
+        "distance": distance,
+        "match_location": {"latitude": other["latitude"], "longitude": other["longitude"]},
+        "status": "pending",
+        "created_at": datetime.now(),
+        "search_request_id": search_request_id
+    }
+
 # Function to find potential matches for a user
 def find_matches(db, user_email, user_location, user_preferences, search_request_id):
     """Find suitable matches for a user based on proximity and preferences."""
     print(f"Finding matches for user email: {user_email}, search_request_id: {search_request_id}")
     
+    # Pick up requests added since the last search, including ones other paths indexed
+    sync_active_index(db)
+    
     # Find user by email in account collection
-    current_user = account_collection.find_one({"email": user_email})
+    current_user = db.account.find_one({"email": user_email})
     if not current_user:
         print(f"User not found with email: {user_email}")
         return []
@@ -71,278 +205,243 @@ def find_matches(db, user_email, user_location, user_preferences, search_request
         
     print(f"Found user: {user_name} ({user_email})")
     
-    # Check that user_location is valid
-    if not user_location or 'latitude' not in user_location or 'longitude' not in user_location:
+    # Check that user_location is valid and normalize it to floats
+    coordinates = normalize_location(user_location)
+    if not coordinates:
         print(f"ERROR: Invalid user location format: {user_location}")
         return []
-        
-    # Ensure location values are floats
-    try:
-        user_lat = float(user_location["latitude"])
-        user_lng = float(user_location["longitude"])
-        user_location = {"latitude": user_lat, "longitude": user_lng}
-        print(f"Using normalized user location: {user_location}")
-    except (ValueError, TypeError) as e:
-        print(f"ERROR: Invalid location coordinates: {str(e)}")
-        return []
+    user_location = {"latitude": coordinates[0], "longitude": coordinates[1]}
     
     # Always use the most recent preferences from the database
     current_preferences = current_user.get("preferences", {})
     if current_preferences:
-        print(f"Using latest preferences from database: {current_preferences}")
         user_preferences = current_preferences
     
-    print(f"Finding matches for user: {user_name}")
-    print(f"Current user preferences: {user_preferences}")
-    print(f"Current user location: {user_location}")
-    
     # Get the restaurant selection from the search request
     search_request = db.search_requests.find_one({"_id": ObjectId(search_request_id)})
-    selected_restaurant = search_request.get("restaurant") if search_request else None
-    
-    if selected_restaurant:
-        restaurant_id = selected_restaurant.get("_id")
-        restaurant_name = selected_restaurant.get("name")
-        print(f"User selected restaurant: {restaurant_name} (ID: {restaurant_id})")
-    
-    # Calculate the cutoff time for active search requests (20 seconds ago)
-    cutoff_time = datetime.now() - timedelta(seconds=20)
+    if not search_request:
+        print(f"Search request not found: {search_request_id}")
+        return []
+    selected_restaurant = search_request.get("restaurant") or {}
+    restaurant_id = selected_restaurant.get("_id")
+    if restaurant_id:
+        print(f"User selected restaurant: {selected_restaurant.get('name')} (ID: {restaurant_id})")
     
-    # Get all other users from account collection, excluding the current user
-    other_users = list(account_collection.find({
-        "email": {"$ne": user_email},  # Exclude current user by email
-        "name": {"$exists": True, "$ne": ""}  # Only include users with valid names
-    }))
+    current_time = datetime.now()
+    if search_request.get("status") != "active" or search_request.get("expires_at", current_time) < current_time:
+        print(f"Search request {search_request_id} is no longer active")
+        return []
     
-    print(f"Found {len(other_users)} other users in database")
+    # Register this request in the index before querying, so any request added
+    # after it is guaranteed to see it
+    active_index.expire(current_time)
+    entry = active_index.add(build_index_entry(dict(search_request, location=user_location), current_user))
+    own_seq = entry["seq"]
+    watermark = entry["evaluated_through"]
     
-    # Filter to only users with active search requests
-    valid_users = []
-    current_time = datetime.now()
-    for other_user in other_users:
-        # Check if they have an active search request within the last 20 seconds
-        active_request = db.search_requests.find_one({
-            "user_email": other_user["email"],
-            "status": "active",
-            "expires_at": {"$gte": current_time}  # Check that the request hasn't expired
-        })
-        
-        # Only include users who selected the same restaurant if the current user selected one
-        if active_request:
-            if selected_restaurant:
-                other_restaurant = active_request.get("restaurant")
-                if other_restaurant and other_restaurant.get("_id") == restaurant_id:
-                    print(f"Found user {other_user['name']} also looking at restaurant {restaurant_name}")
-                    valid_users.append(other_user)
-            else:
-                valid_users.append(other_user)
+    # Only look at searchers in the grid cells around the user
+    nearby = active_index.nearby(
+        user_location["latitude"],
+        user_location["longitude"],
+        config.PROXIMITY_THRESHOLD_KM,
+        current_time
+    )
     
-    print(f"Found {len(valid_users)} users with active search requests")
+    # Incremental matching: only evaluate older requests this one has not seen yet;
+    # newer requests evaluate this one themselves
+    nearby = [(other, distance) for other, distance in nearby if watermark < other["seq"] < own_seq]
+    print(f"Evaluating {len(nearby)} new active searchers within {config.PROXIMITY_THRESHOLD_KM} km")
     
     # Keep track of processed matches to prevent duplicates
     processed_matches = set()
     matches = []
     
-    # For each user, check if they're a potential match based on location
-    for other_user in valid_users:
-        other_user_email = other_user["email"]
+    for other, distance in nearby:
+        other_user_email = other["user_email"]
+        if other_user_email == user_email:
+            continue
+        
+        if not restaurant_compatible(entry, other):
+            continue
         
         # Skip if we've already processed this pair of users
         match_pair = tuple(sorted([user_email, other_user_email]))
         if match_pair in processed_matches:
-            print(f"Skipping duplicate match pair: {match_pair}")
             continue
-            
         processed_matches.add(match_pair)
         
-        # Get other user's name - skip if no name
-        other_user_name = other_user.get("name")
-        if not other_user_name:
-            print(f"Skipping user {other_user_email} - no name set")
-            continue
-            
-        print(f"Evaluating potential match with user: {other_user_name}")
-        
-        # Calculate distance between users
-        try:
-            other_location = other_user.get("location", {})
-            
-            # Skip if location is missing or invalid
-            if not other_location or "latitude" not in other_location or "longitude" not in other_location:
-                print(f"Location missing or invalid for user {other_user_name}, skipping")
-                continue
-                
-            # Normalize to float values
-            try:
-                other_lat = float(other_location["latitude"])
-                other_lng = float(other_location["longitude"])
-                other_location = {"latitude": other_lat, "longitude": other_lng}
-            except (ValueError, TypeError):
-                print(f"Invalid location coordinates for user {other_user_name}, skipping")
-                continue
-                
-            print(f"Comparing locations: {user_location} vs {other_location}")
-            
-            distance = calculate_distance(
-                user_location["latitude"], 
-                user_location["longitude"],
-                other_location["latitude"], 
-                other_location["longitude"]
-            )
-            
-            print(f"Distance between users: {distance} km, threshold: {config.PROXIMITY_THRESHOLD_KM} km")
-            
-            # Check if users are within proximity threshold
-            if distance <= config.PROXIMITY_THRESHOLD_KM:
-                print(f"Users are within range! ({distance} km)")
-                # Get other user's preferences
-                other_preferences = other_user.get("preferences", {})
-                
-                # Create match record
-                match = {
-                    "user_email": user_email,
-                    "user_name": user_name,
-                    "user_preferences": user_preferences,
-                    "match_email": other_user_email,
-                    "match_name": other_user_name,
-                    "match_preferences": other_preferences,
-                    "distance": distance,
-                    "match_location": other_location,
-                    "status": "pending",
-                    "created_at": datetime.now(),
-                    "search_request_id": search_request_id
-                }
-                
-                matches.append(match)
-                print(f"Added match: {other_user_name} - Distance: {distance} km")
-            else:
-                print(f"Users are too far apart: {distance} km")
-        except Exception as e:
-            print(f"Error processing potential match: {str(e)}")
-            traceback.print_exc()
-            continue
+        matches.append(build_match(entry, other, distance, search_request_id, user_preferences))
+        print(f"Added match: {other['user_name']} - Distance: {distance} km")
+    
+    active_index.mark_evaluated(search_request_id, own_seq - 1)
     
     print(f"Found {len(matches)} total matches")
     return matches
 
+# Function to build the canonical key shared by both directions of a match
+def pair_key(email_a, email_b):
+    return "|".join(sorted([email_a, email_b]))
+
+# Callbacks handed the emails on both sides of every saved batch of matches,
+# e.g. to wake requests long-polling for them
+_match_listeners = []
+
+def add_match_listener(callback):
+    _match_listeners.append(callback)
+
 # Function to save matches to database
 def save_matches(db, matches):
+    """Write forward and reverse records for every match in one unordered bulk upsert."""
     if not matches:
-        return
+        return 0
         
     print(f"Saving {len(matches)} matches to database")
-    saved_count = 0
     
-    # Keep track of processed match pairs to prevent duplicates
+    operations = []
     processed_pairs = set()
     
     for match in matches:
-        try:
-            # Create a unique identifier for this match pair
-            match_pair = tuple(sorted([match["user_email"], match["match_email"]]))
-            
-            # Skip if we've already processed this pair
-            if match_pair in processed_pairs:
-                print(f"Skipping duplicate match pair in save: {match_pair}")
-                continue
-                
-            processed_pairs.add(match_pair)
-            
-            # Original match (user_email -> match_email)
-            match_record = {
-                "user_email": match["user_email"],
-                "user_name": match["user_name"],
-                "match_email": match["match_email"],
-                "match_name": match["match_name"],
-                "distance": match["distance"],
-                "match_location": match["match_location"],
-                "match_preferences": match["match_preferences"],
-                "status": "pending",
-                "created_at": datetime.now(),
-                "search_request_id": match.get("search_request_id")
-            }
-            
-            # Check if this match already exists
-            existing_match = db.matches.find_one({
-                "$or": [
-                    {
-                        "user_email": match["user_email"],
-                        "match_email": match["match_email"],
-                        "status": "pending"
-                    },
-                    {
-                        "user_email": match["match_email"],
-                        "match_email": match["user_email"],
-                        "status": "pending"
-                    }
-                ]
-            })
-            
-            if not existing_match:
-                result = db.matches.insert_one(match_record)
-                print(f"Match saved with ID: {result.inserted_id}")
-                saved_count += 1
-                
-                # Create reverse match
-                reverse_match = {
-                    "user_email": match["match_email"],
-                    "user_name": match["match_name"],
-                    "match_email": match["user_email"],
-                    "match_name": match["user_name"],
-                    "distance": match["distance"],
-                    "match_location": match["match_location"],
-                    "match_preferences": match["user_preferences"],
-                    "status": "pending",
-                    "created_at": datetime.now(),
-                    "search_request_id": match.get("search_request_id")
-                }
-                
-                result = db.matches.insert_one(reverse_match)
-                print(f"Reverse match saved with ID: {result.inserted_id}")
-                saved_count += 1
-            else:
-                print(f"Match already exists between {match['user_email']} and {match['match_email']}")
-                
-        except Exception as e:
-            print(f"Error saving match: {str(e)}")
-            traceback.print_exc()
+        key = pair_key(match["user_email"], match["match_email"])
+        if key in processed_pairs:
+            print(f"Skipping duplicate match pair in save: {key}")
+            continue
+        processed_pairs.add(key)
+        
+        created_at = datetime.now()
+        forward = {
+            "user_name": match["user_name"],
+            "match_email": match["match_email"],
+            "match_name": match["match_name"],
+            "distance": match["distance"],
+            "match_location": match["match_location"],
+            "match_preferences": match["match_preferences"],
+            "created_at": created_at,
+            "search_request_id": match.get("search_request_id")
+        }
+        reverse = {
+            "user_name": match["match_name"],
+            "match_email": match["user_email"],
+            "match_name": match["user_name"],
+            "distance": match["distance"],
+            "match_location": match["match_location"],
+            "match_preferences": match["user_preferences"],
+            "created_at": created_at,
+            "search_request_id": match.get("search_request_id")
+        }
+        
+        # Upsert on (pair_key, user_email) among pending matches: an existing
+        # pending match in either direction is left untouched
+        for user_email, record in ((match["user_email"], forward), (match["match_email"], reverse)):
+            operations.append(UpdateOne(
+                {"pair_key": key, "user_email": user_email, "status": "pending"},
+                {"$setOnInsert": record},
+                upsert=True
+            ))
+    
+    if not operations:
+        return 0
+    
+    try:
+        result = db.matches.bulk_write(operations, ordered=False)
+        saved_count = result.upserted_count
+    except BulkWriteError as e:
+        # Duplicate key errors mean another worker saved the same pair first
+        other_errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+        if other_errors:
+            print(f"Error saving matches: {other_errors}")
+        saved_count = e.details.get("nUpserted", 0)
+    except Exception as e:
+        print(f"Error saving matches: {str(e)}")
+        traceback.print_exc()
+        return 0
     
     print(f"Successfully saved {saved_count} match records")
+    emails = [email for match in matches for email in (match["user_email"], match["match_email"])]
+    for callback in _match_listeners:
+        try:
+            callback(emails)
+        except Exception as e:
+            print(f"Match listener failed: {str(e)}")
+    return saved_count
+
+# Function to open the long-lived connection used by the notification publisher
+def get_publisher_connection():
+    credentials = pika.PlainCredentials(config.RABBITMQ_USER, config.RABBITMQ_PASS)
+    parameters = pika.ConnectionParameters(
+        host=config.RABBITMQ_HOST,
+        port=config.RABBITMQ_PORT,
+        virtual_host=config.RABBITMQ_VHOST,
+        credentials=credentials,
+        heartbeat=config.RABBITMQ_HEARTBEAT,
+        blocked_connection_timeout=30,
+        connection_attempts=1
+    )
+    return pika.BlockingConnection(parameters)
+
+# Persistent publisher shared by all searches handled by this worker
+match_publisher = ConfirmedPublisher(config.MATCH_NOTIFICATION_QUEUE, get_publisher_connection)
 
 # Function to send match notifications
 def send_match_notifications(matches):
     if not matches:
         return
-        
-    try:
-        connection = get_rabbitmq_connection()
-        channel = connection.channel()
-        
-        # Declare the notification queue
-        channel.queue_declare(queue=config.MATCH_NOTIFICATION_QUEUE, durable=True)
-        
-        # Send notifications for each match
-        for match in matches:
-            # Publish the match notification
-            channel.basic_publish(
-                exchange='',
-                routing_key=config.MATCH_NOTIFICATION_QUEUE,
-                body=json.dumps(match),
-                properties=pika.BasicProperties(
-                    delivery_mode=2,  # make message persistent
-                    content_type='application/json'
-                )
-            )
-            print(f"Sent match notification for user {match['user_email']} and match {match['match_email']}")
-        
-        connection.close()
-        
-    except Exception as e:
-        traceback.print_exc()
-        print(f"Error sending match notifications: {str(e)}")
+    
+    # Queue the notifications; the publisher thread delivers them in committed batches
+    for match in matches:
+        match_publisher.publish(json.dumps(match, default=str))
+        print(f"Queued match notification for user {match['user_email']} and match {match['match_email']}")
+
+# How long a claimed-but-unfinished request is reserved before another path may retry it
+MATCHING_CLAIM_LEASE_SECONDS = 10
+# Delay before a message whose request is claimed elsewhere is put back on the queue
+MATCHING_CLAIM_RETRY_SECONDS = 1
+
+# Function to claim a search request for matching so only one path evaluates it
+def claim_search_request(db, search_request_id):
+    """Returns a claim token if this caller now owns the request, otherwise None"""
+    now = datetime.now()
+    token = uuid.uuid4().hex
+    claimed = db.search_requests.find_one_and_update(
+        {
+            "_id": ObjectId(search_request_id),
+            "processed": {"$ne": True},
+            "$or": [
+                {"matching_claimed_at": {"$exists": False}},
+                {"matching_claimed_at": {"$lt": now - timedelta(seconds=MATCHING_CLAIM_LEASE_SECONDS)}}
+            ]
+        },
+        {"$set": {"matching_claimed_at": now, "matching_claim": token}},
+        projection={"_id": 1}
+    )
+    return token if claimed is not None else None
+
+# Function to give a claim back after a failure so the request can be retried straight away
+def release_search_request(db, search_request_id, token):
+    db.search_requests.update_one(
+        {"_id": ObjectId(search_request_id), "processed": {"$ne": True}, "matching_claim": token},
+        {"$unset": {"matching_claimed_at": "", "matching_claim": ""}}
+    )
+
+# Function to check whether a search request has been fully matched
+def is_search_request_processed(db, search_request_id):
+    return db.search_requests.find_one(
+        {"_id": ObjectId(search_request_id), "processed": True}, {"_id": 1}
+    ) is not None
+
+# Function to put a message back on the queue after a short delay, without blocking the consumer
+def requeue_later(ch, method):
+    ch.connection.call_later(
+        MATCHING_CLAIM_RETRY_SECONDS,
+        functools.partial(ch.basic_nack, delivery_tag=method.delivery_tag, requeue=True)
+    )
 
 # Function to process a search request - can be called directly or via RabbitMQ
-def process_search_request(ch=None, method=None, properties=None, body=None, direct_data=None):
+def process_search_request(ch=None, method=None, properties=None, body=None, direct_data=None, mongo_db=None):
+    # Consumer pool workers pass their own database handle
+    if mongo_db is None:
+        mongo_db = db
+    claim = None
+    search_request_id = None
     try:
         # Parse the search request
         if body:
@@ -361,11 +460,32 @@ def process_search_request(ch=None, method=None, properties=None, body=None, dir
         print(f"Processing search request for user {user_email}")
         print(f"Request data: {request_data}")
         
+        # Skip requests another path (HTTP fallback, change stream, redelivery) already matched
+        claim = claim_search_request(mongo_db, search_request_id)
+        if not claim:
+            if is_search_request_processed(mongo_db, search_request_id):
+                print(f"Search request {search_request_id} already matched, skipping")
+                if ch and method:
+                    ch.basic_ack(delivery_tag=method.delivery_tag)
+            else:
+                # Claimed by a path that has not finished (or crashed): keep the message
+                # until that path marks it processed or its lease runs out
+                print(f"Search request {search_request_id} is being matched elsewhere, requeueing")
+                if ch and method:
+                    requeue_later(ch, method)
+            return []
+        
         # Find potential matches
-        matches = find_matches(db, user_email, location, preferences, search_request_id)
+        matches = find_matches(mongo_db, user_email, location, preferences, search_request_id)
         
         # Save matches to database
-        save_matches(db, matches)
+        save_matches(mongo_db, matches)
+        
+        # Mark the request as processed so it is never matched again
+        mongo_db.search_requests.update_one(
+            {"_id": ObjectId(search_request_id)},
+            {"$set": {"processed": True}}
+        )
         
         # Send match notifications
         try:
@@ -373,7 +493,7 @@ def process_search_request(ch=None, method=None, properties=None, body=None, dir
         except Exception as e:
             print(f"Error sending match notifications: {str(e)}")
         
-        # Acknowledge the message if coming from RabbitMQ
+        # Acknowledge the message only once it has been fully handled
         if ch and method:
             ch.basic_ack(delivery_tag=method.delivery_tag)
         
@@ -383,74 +503,381 @@ def process_search_request(ch=None, method=None, properties=None, body=None, dir
     except Exception as e:
         traceback.print_exc()
         print(f"Error processing search request: {str(e)}")
-        # Negative acknowledgment if coming from RabbitMQ
+        if claim:
+            try:
+                release_search_request(mongo_db, search_request_id, claim)
+            except PyMongoError as release_error:
+                print(f"Could not release claim on {search_request_id}: {str(release_error)}")
+        # Requeue once; a message that already failed on redelivery is dropped
+        # instead of looping between workers forever
         if ch and method:
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=not method.redelivered)
 
-# Function to start consuming from the search request queue
-def start_consuming():
+# Batch-window pairing mode: requests collected over a short window are paired
+# together in one pass instead of each getting every nearby searcher
+_batch_queue = queue.Queue()
+_batch_thread = None
+_batch_thread_lock = threading.Lock()
+
+# Function to hand a search request to the batch matcher; on_done(status) is called once it is handled,
+# with "done", "retry" (claimed by another path) or "failed"
+def submit_to_batch(request_data, on_done=None):
+    _batch_queue.put((request_data, on_done))
+    start_batch_matcher()
+
+# Function to pair every request collected in one window
+def run_batch_window(mongo_db, items):
+    """
+    Pair the window's requests with each other and with still-unpaired active
+    searchers, shortest distance first, so each request gets at most one
+    pending match. Writes all matches in one bulk write.
+    """
+    current_time = datetime.now()
+    claims = {}
+    for request_data, _ in items:
+        search_request_id = request_data.get("search_request_id")
+        if search_request_id:
+            token = claim_search_request(mongo_db, search_request_id)
+            if token:
+                claims[search_request_id] = token
+    claimed_ids = list(claims)
+    
     try:
+        # Load the window's requests and their users with one query each
+        object_ids = [ObjectId(search_request_id) for search_request_id in claimed_ids]
+        window_requests = list(mongo_db.search_requests.find({
+            "_id": {"$in": object_ids},
+            "status": "active",
+            "expires_at": {"$gte": current_time}
+        }).sort("_id", 1)) if object_ids else []
+        emails = list({req["user_email"] for req in window_requests})
+        accounts = {}
+        if emails:
+            for account in mongo_db.account.find({"email": {"$in": emails}}, {"email": 1, "name": 1, "preferences": 1}):
+                accounts[account["email"]] = account
+    
+        active_index.expire(current_time)
+        new_entries = []
+        for req in window_requests:
+            entry = build_index_entry(req, accounts.get(req["user_email"]))
+            if entry:
+                new_entries.append(active_index.add(entry))
+    
+        neighbours = [
+            (entry, active_index.nearby(entry["latitude"], entry["longitude"], config.PROXIMITY_THRESHOLD_KM, current_time))
+            for entry in new_entries
+        ]
+        
+        # Searchers that already hold a pending match (paired in an earlier window, by a
+        # redelivery or by another process) are not paired again
+        emails = {entry["user_email"] for entry in new_entries}
+        emails.update(other["user_email"] for _, nearby in neighbours for other, _ in nearby)
+        already_matched = set(mongo_db.matches.distinct("user_email", {
+            "user_email": {"$in": list(emails)},
+            "status": "pending"
+        })) if emails else set()
+        for entry in new_entries:
+            if entry["user_email"] in already_matched:
+                entry["paired"] = True
+        
+        # Candidate pairs involving at least one new request; older unpaired pairs were already ruled out
+        edges = {}
+        for entry, nearby in neighbours:
+            if entry.get("paired"):
+                continue
+            for other, distance in nearby:
+                if other["user_email"] == entry["user_email"] or other.get("paired"):
+                    continue
+                if other["user_email"] in already_matched:
+                    other["paired"] = True
+                    continue
+                newer, older = (entry, other) if entry["seq"] > other["seq"] else (other, entry)
+                if restaurant_compatible(newer, older):
+                    edges[(older["seq"], newer["seq"])] = (distance, older, newer)
+    
+        # Distance-ranked assignment: closest pairs first, each searcher used at most once
+        assigned_emails = set()
+        matches = []
+        for distance, older, newer in sorted(edges.values(), key=lambda edge: edge[0]):
+            if older["user_email"] in assigned_emails or newer["user_email"] in assigned_emails:
+                continue
+            assigned_emails.update([older["user_email"], newer["user_email"]])
+            older["paired"] = True
+            newer["paired"] = True
+            matches.append(build_match(newer, older, distance, newer["search_request_id"]))
+    
+        save_matches(mongo_db, matches)
+        try:
+            send_match_notifications(matches)
+        except Exception as e:
+            print(f"Error sending match notifications: {str(e)}")
+    
+        if object_ids:
+            mongo_db.search_requests.update_many({"_id": {"$in": object_ids}}, {"$set": {"processed": True}})
+    
+        print(f"Batch window: {len(items)} requests, {len(edges)} candidate pairs, {len(matches)} pairs matched")
+        return matches
+    except Exception:
+        # Hand the claims back so the requeued messages can be matched straight away
+        for search_request_id, token in claims.items():
+            try:
+                release_search_request(mongo_db, search_request_id, token)
+            except PyMongoError as e:
+                print(f"Could not release claim on {search_request_id}: {str(e)}")
+        raise
+
+# Function run by the batch matcher thread
+def batch_window_loop():
+    window_seconds = config.MATCHING_BATCH_WINDOW_MS / 1000
+    while True:
+        # Block until a request arrives, so idle periods cost nothing
+        items = [_batch_queue.get()]
+        time.sleep(window_seconds)
+        while len(items) < config.MATCHING_BATCH_MAX_SIZE:
+            try:
+                items.append(_batch_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        try:
+            run_batch_window(db, items)
+            # Only requests that are now processed are done; the rest are claimed by another path
+            ids = [ObjectId(request_data["search_request_id"]) for request_data, _ in items if request_data.get("search_request_id")]
+            processed = {
+                str(doc["_id"]) for doc in db.search_requests.find({"_id": {"$in": ids}, "processed": True}, {"_id": 1})
+            } if ids else set()
+            statuses = [
+                "done" if not request_data.get("search_request_id") or request_data["search_request_id"] in processed else "retry"
+                for request_data, _ in items
+            ]
+        except Exception as e:
+            print(f"Error in batch window: {str(e)}")
+            traceback.print_exc()
+            statuses = ["failed"] * len(items)
+        
+        for (_, on_done), status in zip(items, statuses):
+            if on_done:
+                on_done(status)
+
+def start_batch_matcher():
+    global _batch_thread
+    with _batch_thread_lock:
+        if _batch_thread is None:
+            _batch_thread = threading.Thread(target=batch_window_loop, daemon=True)
+            _batch_thread.start()
+
+# RabbitMQ callback used in batch mode; the ack is sent once the window is written
+def enqueue_search_message(ch, method, properties, body):
+    try:
+        request_data = json.loads(body)
+    except ValueError:
+        print(f"Dropping malformed search request message: {body}")
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        return
+    
+    # pika channels are not thread-safe, so ack from the consumer's own thread
+    connection = ch.connection
+    def on_done(status):
+        if status == "done":
+            callback = functools.partial(ch.basic_ack, delivery_tag=method.delivery_tag)
+        elif status == "retry":
+            callback = functools.partial(requeue_later, ch, method)
+        else:
+            callback = functools.partial(ch.basic_nack, delivery_tag=method.delivery_tag, requeue=not method.redelivered)
+        connection.add_callback_threadsafe(callback)
+    
+    submit_to_batch(request_data, on_done)
+
+# Function run by each consumer pool worker
+def consume_worker(worker_id):
+    """
+    Consume search requests on a dedicated connection, channel and Mongo client.
+    Messages are acked only after processing, so if this worker dies its
+    unacked messages are redelivered to the other workers.
+    """
+    backoff = 1
+    while True:
+        connection = None
+        worker_client = MongoClient(config.MONGODB_URI)
         try:
+            worker_db = worker_client["bitebuddies"]
             connection = get_rabbitmq_connection()
             channel = connection.channel()
-            
-            # Declare the queue
             channel.queue_declare(queue=config.SEARCH_REQUEST_QUEUE, durable=True)
-            
-            # Set prefetch count to 1 to ensure fair dispatching
-            channel.basic_qos(prefetch_count=1)
-            
-            # Register the callback function
+            if config.MATCHING_MODE == "batch":
+                # Let a whole window's worth of messages be in flight at once
+                prefetch = max(config.MATCHING_PREFETCH, config.MATCHING_BATCH_MAX_SIZE)
+                callback = enqueue_search_message
+            else:
+                prefetch = config.MATCHING_PREFETCH
+                callback = functools.partial(process_search_request, mongo_db=worker_db)
+            channel.basic_qos(prefetch_count=prefetch)
             channel.basic_consume(
                 queue=config.SEARCH_REQUEST_QUEUE,
-                on_message_callback=process_search_request
+                on_message_callback=callback
             )
-            
-            print("Matching Service started. Waiting for search requests...")
+            print(f"Matching worker {worker_id} waiting for search requests (mode={config.MATCHING_MODE}, prefetch={prefetch})")
+            backoff = 1
             channel.start_consuming()
-        except Exception as rabbitmq_error:
-            print(f"Failed to connect to RabbitMQ: {str(rabbitmq_error)}")
-            print("Starting in polling mode (checking database directly)...")
+        except Exception as e:
+            print(f"Matching worker {worker_id} stopped: {str(e)}; restarting in {backoff}s")
+            traceback.print_exc()
+        finally:
+            try:
+                if connection is not None and connection.is_open:
+                    connection.close()
+            except Exception:
+                pass
+            worker_client.close()
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+# Function to turn a search_requests document into a queue-style message
+def search_request_to_message(search_request):
+    return {
+        "user_email": search_request["user_email"],
+        "location": search_request.get("location"),
+        "preferences": {"restaurant": search_request.get("restaurant") or {}},
+        "search_request_id": str(search_request["_id"]),
+        "proximity_threshold_km": search_request.get("proximity_threshold_km", config.PROXIMITY_THRESHOLD_KM)
+    }
+
+# Function to match a search request read from the database
+def process_stored_search_request(search_request):
+    if config.MATCHING_MODE == "batch":
+        submit_to_batch(search_request_to_message(search_request))
+    else:
+        process_search_request(direct_data=search_request_to_message(search_request))
+
+# Resume token persistence so a restarted worker continues where it left off
+CHANGE_STREAM_STATE_ID = "search_requests_change_stream"
+RESUME_TOKEN_SAVE_EVERY = 20  # events
+RESUME_TOKEN_SAVE_SECONDS = 5
+
+def load_resume_token():
+    state = db.matching_state.find_one({"_id": CHANGE_STREAM_STATE_ID})
+    return state.get("resume_token") if state else None
+
+def save_resume_token(resume_token):
+    db.matching_state.update_one(
+        {"_id": CHANGE_STREAM_STATE_ID},
+        {"$set": {"resume_token": resume_token, "updated_at": datetime.now()}},
+        upsert=True
+    )
+
+# Function to match active requests that were created while nothing was listening
+def catch_up_unprocessed_requests():
+    pending = list(db.search_requests.find({
+        "status": "active",
+        "processed": {"$ne": True},
+        "expires_at": {"$gte": datetime.now()}
+    }).sort("_id", 1))
+    if pending:
+        print(f"Catching up on {len(pending)} unprocessed search requests")
+    for search_request in pending:
+        process_stored_search_request(search_request)
+
+# Function to match search requests as soon as they are inserted, when RabbitMQ is unavailable
+def watch_search_requests():
+    """
+    Tail a change stream on search_requests inserts and dispatch each new
+    request to the matcher immediately. Falls back to polling if the
+    deployment does not support change streams (standalone mongod).
+    """
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    resume_token = load_resume_token()
+    backoff = 1
+    
+    while True:
+        try:
+            with db.search_requests.watch(pipeline, resume_after=resume_token) as stream:
+                print("Watching search_requests change stream for new searches...")
+                backoff = 1
+                if resume_token is None:
+                    # The stream is open, so every insert from here on reaches it; the catch-up
+                    # covers the ones before. A request seen by both is only matched once (claim).
+                    catch_up_unprocessed_requests()
+                unsaved = 0
+                last_saved = time.time()
+                try:
+                    for change in stream:
+                        try:
+                            process_stored_search_request(change["fullDocument"])
+                        except Exception as e:
+                            print(f"Error processing search request from change stream: {str(e)}")
+                            traceback.print_exc()
+                        resume_token = stream.resume_token
+                        unsaved += 1
+                        # Save the token every few events or seconds rather than on every event;
+                        # a restart replays at most that many, which the claim makes harmless
+                        if unsaved >= RESUME_TOKEN_SAVE_EVERY or time.time() - last_saved >= RESUME_TOKEN_SAVE_SECONDS:
+                            save_resume_token(resume_token)
+                            unsaved = 0
+                            last_saved = time.time()
+                finally:
+                    if unsaved:
+                        try:
+                            save_resume_token(resume_token)
+                        except PyMongoError as e:
+                            print(f"Could not save change stream resume token: {str(e)}")
+        except OperationFailure as e:
+            # 40573: change streams need a replica set; 286: resume point fell off the oplog
+            if e.code == 40573:
+                print("Change streams not supported by this deployment, falling back to polling")
+                poll_database_for_requests()
+                return
+            if e.code == 286:
+                print("Change stream resume token is no longer valid, restarting from now")
+                resume_token = None
+                continue
+            print(f"Change stream error: {str(e)}; retrying in {backoff}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+        except PyMongoError as e:
+            print(f"Change stream error: {str(e)}; retrying in {backoff}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+# Function to poll the database when neither RabbitMQ nor change streams are available
+def poll_database_for_requests():
+    while True:
+        try:
+            catch_up_unprocessed_requests()
             
-            # Poll the database for search requests that don't have matches yet
-            last_check_time = 0
+            # Sleep a bit to avoid high CPU usage
+            time.sleep(1)
             
-            while True:
-                try:
-                    current_time = int(time.time())
-                    
-                    # Check every 10 seconds
-                    if current_time - last_check_time >= 10:
-                        last_check_time = current_time
-                        
-                        # Look for recently created search requests in the database
-                        search_requests_collection = db["search_requests"]
-                        
-                        # Find recent search requests without matches
-                        recent_requests = list(search_requests_collection.find({
-                            "processed": {"$ne": True},
-                            "created_at": {"$gt": datetime.now() - timedelta(minutes=5)}  # Look at last 5 minutes
-                        }).limit(5))
-                        
-                        if recent_requests:
-                            print(f"Found {len(recent_requests)} unprocessed search requests")
-                            
-                            for request in recent_requests:
-                                # Process the request
-                                process_search_request(direct_data=request)
-                                
-                                # Mark as processed
-                                search_requests_collection.update_one(
-                                    {"_id": request["_id"]},
-                                    {"$set": {"processed": True}}
-                                )
-                    
-                    # Sleep a bit to avoid high CPU usage
-                    time.sleep(1)
-                    
-                except Exception as e:
-                    print(f"Error in polling mode: {str(e)}")
-                    time.sleep(5)  # Wait longer after an error
+        except Exception as e:
+            print(f"Error in polling mode: {str(e)}")
+            time.sleep(5)  # Wait longer after an error
+
+# Function to start consuming from the search request queue
+def start_consuming():
+    try:
+        try:
+            # Make sure RabbitMQ is reachable before starting the pool
+            connection = get_rabbitmq_connection()
+            connection.close()
+        except Exception as rabbitmq_error:
+            print(f"Failed to connect to RabbitMQ: {str(rabbitmq_error)}")
+            print("Starting in change stream mode (watching the database directly)...")
+            seed_active_index(db)
+            watch_search_requests()
+            return
+        
+        # Warm the spatial index before taking new requests
+        seed_active_index(db)
+        
+        # Start the consumer pool; each worker has its own channel and Mongo client
+        workers = []
+        for worker_id in range(config.MATCHING_WORKERS):
+            worker = threading.Thread(target=consume_worker, args=(worker_id,), daemon=True)
+            worker.start()
+            workers.append(worker)
+        
+        print(f"Matching Service started with {len(workers)} workers. Waiting for search requests...")
+        for worker in workers:
+            worker.join()
         
     except KeyboardInterrupt:
         print("Matching Service stopped.")
@@ -462,7 +889,11 @@ def start_consuming():
         # Wait and retry
         time.sleep(5)
         start_consuming()
+
 if __name__ == "__main__":
+    # The pending-pair unique index backs the save path; build it off the hot path
+    ensure_indexes_in_background(db, ["matches"])
+    
     # Start the service in a separate thread
     thread = threading.Thread(target=start_consuming)
     thread.daemon = True
@@ -0,0 +1,117 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are read in a fixed sort order that always ends with _id, and the
+cursor is an opaque token holding the sort values of the last document
+returned. The next page starts strictly after that document, so paging
+costs the same at any depth and is not thrown off by inserts.
+
+    docs, next_cursor = paginate(collection, {"user_email": email},
+                                 sort=[("created_at", -1)],
+                                 limit=request.args.get("limit"),
+                                 cursor=request.args.get("cursor"))
+
+next_cursor is None on the last page. A request without a limit gets
+DEFAULT_PAGE_SIZE documents, so no listing is ever returned unbounded; clients
+that need everything follow next_cursor until it is None.
+"""
+import base64
+import json
+
+from bson import json_util
+from pymongo import ASCENDING
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor this module did not produce"""
+
+
+def page_size(limit):
+    """Clamp a requested page size (string, int or None) to 1..MAX_PAGE_SIZE"""
+    if limit in (None, ""):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise InvalidCursor(f"Invalid page size: {limit}")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def _sort_keys(sort):
+    keys = list(sort or [])
+    if not keys or keys[-1][0] != "_id":
+        # _id breaks ties so every document has a unique position
+        keys.append(("_id", keys[-1][1] if keys else ASCENDING))
+    return keys
+
+
+def _after(keys, values):
+    """Build the filter for documents that sort strictly after `values`"""
+    branches = []
+    for i, (field, direction) in enumerate(keys):
+        branch = {keys[j][0]: values[j] for j in range(i)}
+        branch[field] = {"$gt" if direction == ASCENDING else "$lt": values[i]}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+def paginate(collection, query=None, sort=None, limit=None, cursor=None, projection=None):
+    """
+    Fetch one page of documents.
+
+    Args:
+        collection: pymongo Collection
+        query (dict): Filter for the listing
+        sort (list): (field, direction) pairs; _id is appended as a tiebreaker
+        limit: Requested page size, clamped by page_size()
+        cursor (str): next_cursor from the previous page, or None for the first page
+        projection (dict): Optional projection; sort fields are always included
+
+    Returns:
+        tuple: (documents, next_cursor)
+    """
+    keys = _sort_keys(sort)
+    limit = page_size(limit)
+    query = dict(query or {})
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise InvalidCursor("Cursor does not match this listing")
+        query = {"$and": [query, _after(keys, values)]} if query else _after(keys, values)
+
+    if projection:
+        projection = dict(projection)
+        for field, _ in keys:
+            projection.setdefault(field, 1)
+
+    docs = list(collection.find(query, projection).sort(keys).limit(limit + 1))
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor([_field_value(docs[-1], field) for field, _ in keys])
+    return docs, next_cursor
+
+
+def _field_value(doc, field):
+    value = doc
+    for part in field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
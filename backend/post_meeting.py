@@ -57,11 +57,18 @@ def get_user_meeting_posts(userEmail):
         meeting_service_url = os.getenv("MEETING_SERVICE_URL", "http://localhost:8003")
         user_meetings_url = f"{meeting_service_url}/get_user_meetings/{userEmail}"
         
-        response = requests.get(user_meetings_url)
-        if not response.ok:
-            return jsonify({"error": f"Failed to fetch user meetings: {response.text}"}), 500
-        
-        meetings = response.json()
+        # The meeting service returns one page at a time; follow X-Next-Cursor to the end
+        meetings = []
+        params = {}
+        while True:
+            response = requests.get(user_meetings_url, params=params)
+            if not response.ok:
+                return jsonify({"error": f"Failed to fetch user meetings: {response.text}"}), 500
+            meetings.extend(response.json())
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+            params = {"cursor": next_cursor}
         meeting_ids = [meeting.get("meeting_id") or meeting.get("id") or meeting.get("_id") for meeting in meetings]
         
         # Then, query for posts that have any of these meeting IDs
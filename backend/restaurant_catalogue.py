@@ -0,0 +1,287 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+import traceback
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content-Encodings bodies can be stored in, most preferred first. Levels are
+# moderate: bodies are compressed once per catalogue version, but that happens
+# on every reload, and the top levels cost several times more for a few percent
+COMPRESSORS = {}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=5)
+COMPRESSORS["gzip"] = lambda body: gzip.compress(body, compresslevel=6)
+
+# Smaller bodies are always sent uncompressed; encoding them saves nothing
+MIN_COMPRESS_BYTES = 1024
+
+
+def serialize(payload):
+    """Encode a response body the way the catalogue endpoints send it"""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def compress(body, encoding):
+    """Return (encoding actually used, payload) for body in the requested encoding"""
+    if encoding not in COMPRESSORS or len(body) < MIN_COMPRESS_BYTES:
+        return "identity", body
+    return encoding, COMPRESSORS[encoding](body)
+
+
+class RestaurantCatalogue:
+    """
+    Versioned in-process copy of the restaurants collection.
+
+    The whole collection is loaded into memory with hash indexes by id, name
+    and region, and reloaded whenever it changes: through a change stream on
+    the collection (so writes from any replica are seen), or every
+    fallback_refresh seconds when change streams are unavailable. Change events
+    arriving within coalesce_ms of each other (a bulk update, say) are drained
+    together and cost a single reload. After a write of its own, this process
+    calls after_write(), which waits for the reload the change stream triggers
+    instead of loading a second time. Each load bumps the version and computes
+    an ETag from the catalogue's content, so every replica hands out the same
+    tag for the same data. Serialized response bodies, and their gzip/brotli
+    encodings, are cached per version, which makes repeat reads cost neither a
+    database round trip nor a re-serialization or re-compression. The full
+    catalogue is serialized as part of each load and compressed in every
+    encoding on a background thread, so neither the reload nor the write that
+    caused it waits on compression. Listeners registered with add_listener()
+    are handed the new restaurant list after each load, so derived indexes stay
+    in step.
+
+    Restaurant dicts handed out by the read methods are shared; callers must
+    copy them before changing anything.
+    """
+
+    def __init__(self, collection, fallback_refresh=60, coalesce_ms=200, max_coalesce_seconds=2):
+        self.collection = collection
+        self.fallback_refresh = fallback_refresh
+        self.coalesce_ms = coalesce_ms
+        self.max_coalesce_seconds = max_coalesce_seconds
+        self.push_available = False
+        self.version = 0
+        self.etag = None
+        self.loaded_at = None
+        self._restaurants = []
+        self._by_id = {}
+        self._by_name = {}
+        self._by_region = {}
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # Loads are numbered as they start; _loaded_through is the newest one finished
+        self._loads_started = 0
+        self._loaded_through = 0
+        self._loaded = threading.Condition()
+        self._listeners = []
+        self._thread = None
+
+    def add_listener(self, callback):
+        """Call callback(restaurants) after every load, starting with the current catalogue if loaded"""
+        with self._refresh_lock:
+            self._listeners.append(callback)
+            if self.etag is not None:
+                callback(self._restaurants)
+
+    def refresh(self):
+        """Reload the catalogue from the database and publish it as a new version"""
+        # One reload at a time, so an older read can never replace a newer one
+        with self._refresh_lock:
+            return self._load()
+
+    def after_write(self, timeout=2):
+        """
+        Make a write this process has just made visible to its next read.
+        With a change stream running, waits for the reload the write triggers;
+        otherwise, or if that reload is late, reloads here.
+        """
+        # Any load numbered above this one started after the write finished
+        mark = self._loads_started
+        if self.push_available:
+            with self._loaded:
+                if self._loaded.wait_for(lambda: self._loaded_through > mark, timeout):
+                    return self.version
+        return self.refresh()
+
+    def _load(self):
+        self._loads_started += 1
+        started = self._loads_started
+        restaurants = list(self.collection.find())
+        by_id = {}
+        by_name = {}
+        by_region = {}
+        for restaurant in restaurants:
+            restaurant["_id"] = str(restaurant["_id"])
+            by_id[restaurant["_id"]] = restaurant
+            # Keep the first restaurant with a given name, like find_one did
+            by_name.setdefault(restaurant.get("name"), restaurant)
+            by_region.setdefault(restaurant.get("region"), []).append(restaurant)
+
+        body = serialize(restaurants)
+        etag = hashlib.sha1(body).hexdigest()
+        bodies = {("all", "identity"): ("identity", body)}
+        with self._lock:
+            self._restaurants = restaurants
+            self._by_id = by_id
+            self._by_name = by_name
+            self._by_region = by_region
+            self._bodies = bodies
+            self.version += 1
+            self.etag = etag
+            self.loaded_at = time.time()
+        for callback in self._listeners:
+            try:
+                callback(restaurants)
+            except Exception as e:
+                print(f"Restaurant catalogue listener failed: {str(e)}")
+                traceback.print_exc()
+        with self._loaded:
+            self._loaded_through = started
+            self._loaded.notify_all()
+        # Compress the full catalogue in the background; requests that arrive
+        # first compress it themselves
+        threading.Thread(target=self._precompress, args=(bodies, body), daemon=True).start()
+        return self.version
+
+    def _precompress(self, bodies, body):
+        for encoding in COMPRESSORS:
+            try:
+                encoded = compress(body, encoding)
+            except Exception as e:
+                print(f"Error compressing restaurant catalogue ({encoding}): {str(e)}")
+                continue
+            with self._lock:
+                if bodies is not self._bodies:
+                    return
+                bodies.setdefault(("all", encoding), encoded)
+
+    def _ensure_loaded(self):
+        if self.etag is None:
+            with self._refresh_lock:
+                if self.etag is None:
+                    self._load()
+
+    def current_etag(self):
+        self._ensure_loaded()
+        return self.etag
+
+    def all(self):
+        self._ensure_loaded()
+        return self._restaurants
+
+    def by_id(self, restaurant_id):
+        self._ensure_loaded()
+        return self._by_id.get(str(restaurant_id))
+
+    def by_name(self, name):
+        self._ensure_loaded()
+        return self._by_name.get(name)
+
+    def by_region(self, region):
+        self._ensure_loaded()
+        return self._by_region.get(region, [])
+
+    def body(self, key, build, encoding="identity"):
+        """
+        Return (etag, content encoding, payload) for a view of the catalogue.
+        The body is built with build() and compressed only the first time it
+        is asked for in this version. Bodies with key None are built every
+        time and never cached. The encoding falls back to identity when the
+        requested one is unavailable or the body is too small to compress.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            bodies = self._bodies
+            etag = self.etag
+            cached = bodies.get((key, encoding))
+        if cached is not None:
+            return (etag,) + cached
+        if key is None:
+            return (etag,) + compress(serialize(build()), encoding)
+
+        with self._lock:
+            identity = bodies.get((key, "identity"))
+        if identity is None:
+            identity = ("identity", serialize(build()))
+        encoded = compress(identity[1], encoding)
+        with self._lock:
+            # Only keep them if the catalogue did not move on while they were built
+            if bodies is self._bodies:
+                bodies[(key, "identity")] = identity
+                bodies[(key, encoding)] = encoded
+        return (etag,) + encoded
+
+    def stats(self):
+        # body() and _precompress() add to the dict, so iterate over a copy
+        with self._lock:
+            bodies = dict(self._bodies)
+        return {
+            "version": self.version,
+            "etag": self.etag,
+            "restaurants": len(self._restaurants),
+            "cached_bodies": len(bodies),
+            "encodings": list(COMPRESSORS),
+            "all_bytes": {
+                key[1]: len(payload) for key, (_, payload) in bodies.items() if key[0] == "all"
+            },
+            "loaded_at": self.loaded_at,
+            "change_stream": self.push_available
+        }
+
+    def _watch(self):
+        backoff = 1
+        while True:
+            try:
+                # Short getMore waits let a quiet stream tell a burst has ended
+                with self.collection.watch(max_await_time_ms=self.coalesce_ms) as stream:
+                    print("Watching restaurants change stream for catalogue updates...")
+                    self.push_available = True
+                    backoff = 1
+                    # Pick up anything written before the stream opened
+                    self.refresh()
+                    for _ in stream:
+                        # Drain the rest of the burst, then reload once for all of it
+                        deadline = time.monotonic() + self.max_coalesce_seconds
+                        while time.monotonic() < deadline and stream.try_next() is not None:
+                            pass
+                        self.refresh()
+            except OperationFailure as e:
+                self.push_available = False
+                # 40573: change streams need a replica set
+                if e.code == 40573:
+                    print(f"Change streams not supported by this deployment, reloading the catalogue every {self.fallback_refresh}s")
+                    self._poll()
+                    return
+                print(f"Restaurants change stream error: {str(e)}; retrying in {backoff}s")
+            except PyMongoError as e:
+                self.push_available = False
+                print(f"Restaurants change stream error: {str(e)}; retrying in {backoff}s")
+            except Exception as e:
+                self.push_available = False
+                print(f"Error in restaurants change stream: {str(e)}")
+                traceback.print_exc()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _poll(self):
+        while True:
+            time.sleep(self.fallback_refresh)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error reloading restaurant catalogue: {str(e)}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, daemon=True)
+            self._thread.start()
+        return self
@@ -0,0 +1,183 @@
+import heapq
+import math
+import threading
+
+from geo_distance import EARTH_RADIUS_KM
+
+
+def to_unit_vector(latitude, longitude):
+    """Point on the unit sphere for a latitude/longitude; chord length grows with great-circle distance"""
+    lat = math.radians(latitude)
+    lng = math.radians(longitude)
+    return (math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+def km_to_chord(kilometers):
+    return 2 * math.sin(min(kilometers / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def _squared_distance(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+class _Node:
+    __slots__ = ("point", "restaurant", "axis", "left", "right")
+
+    def __init__(self, point, restaurant, axis, left, right):
+        self.point = point
+        self.restaurant = restaurant
+        self.axis = axis
+        self.left = left
+        self.right = right
+
+
+class RestaurantKDTree:
+    """
+    k-nearest-neighbour index over restaurant coordinates.
+
+    Restaurants are placed on the unit sphere as 3D points, so straight-line
+    (chord) distance between points orders them exactly like great-circle
+    distance and a plain KD-tree answers nearest-neighbour queries in
+    logarithmic time. update() is given the full restaurant list after every
+    catalogue reload: when the only change is new restaurants, they go into a
+    small pending list that queries scan alongside the tree, and the tree is
+    rebuilt once that list grows past rebuild_ratio of the tree. Any removal or
+    move rebuilds the tree straight away.
+    """
+
+    def __init__(self, rebuild_ratio=0.25, min_pending=32):
+        self.rebuild_ratio = rebuild_ratio
+        self.min_pending = min_pending
+        self._root = None
+        self._size = 0
+        self._pending = []
+        self._positions = {}
+        self._lock = threading.Lock()
+        self.stats = {"rebuilds": 0, "incremental_inserts": 0, "queries": 0}
+
+    @staticmethod
+    def _locate(restaurant):
+        try:
+            latitude = float(restaurant["latitude"])
+            longitude = float(restaurant["longitude"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return None
+        return latitude, longitude
+
+    def _build(self, items, depth=0):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        middle = len(items) // 2
+        point, restaurant = items[middle]
+        return _Node(
+            point, restaurant, axis,
+            self._build(items[:middle], depth + 1),
+            self._build(items[middle + 1:], depth + 1)
+        )
+
+    def update(self, restaurants):
+        """Bring the index in line with the catalogue's current restaurant list"""
+        positions = {}
+        items = []
+        for restaurant in restaurants:
+            position = self._locate(restaurant)
+            if position is not None:
+                positions[restaurant["_id"]] = position
+                items.append((to_unit_vector(*position), restaurant))
+
+        with self._lock:
+            previous = self._positions
+            unchanged = all(positions.get(key) == position for key, position in previous.items())
+            added = [item for item in items if item[1]["_id"] not in previous]
+            limit = max(self.min_pending, int(self._size * self.rebuild_ratio))
+            if unchanged and len(self._pending) + len(added) <= limit and self._root is not None:
+                # Only new restaurants: keep the tree, queue them up
+                current = {item[1]["_id"]: item for item in items}
+                self._refresh_restaurants(self._root, current)
+                self._pending = [current[item[1]["_id"]] for item in self._pending] + added
+                self.stats["incremental_inserts"] += len(added)
+            else:
+                self._root = self._build(items)
+                self._size = len(items)
+                self._pending = []
+                self.stats["rebuilds"] += 1
+            self._positions = positions
+
+    def _refresh_restaurants(self, node, current):
+        """Point tree nodes at the latest copy of each restaurant (details may have changed)"""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            node.restaurant = current[node.restaurant["_id"]][1]
+            stack.append(node.left)
+            stack.append(node.right)
+
+    def __len__(self):
+        with self._lock:
+            return self._size + len(self._pending)
+
+    def nearest(self, latitude, longitude, k, matches=None, max_distance_km=None):
+        """
+        Return up to k (restaurant, distance_km) pairs, closest first.
+
+        Args:
+            matches: Optional predicate; restaurants it rejects are skipped
+            max_distance_km: Optional cap on distance
+        """
+        target = to_unit_vector(latitude, longitude)
+        bound = km_to_chord(max_distance_km) ** 2 if max_distance_km is not None else math.inf
+        # Max-heap (negated distances) of the best k seen so far
+        best = []
+        counter = 0
+
+        def consider(point, restaurant):
+            nonlocal counter
+            distance = _squared_distance(point, target)
+            if distance > bound or (len(best) == k and distance >= -best[0][0]):
+                return
+            if matches is not None and not matches(restaurant):
+                return
+            counter += 1
+            entry = (-distance, counter, restaurant)
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            else:
+                heapq.heapreplace(best, entry)
+
+        def worst():
+            if len(best) < k:
+                return bound
+            return -best[0][0]
+
+        def search(node):
+            if node is None:
+                return
+            consider(node.point, node.restaurant)
+            gap = target[node.axis] - node.point[node.axis]
+            near, far = (node.left, node.right) if gap < 0 else (node.right, node.left)
+            search(near)
+            if gap * gap <= worst():
+                search(far)
+
+        with self._lock:
+            root = self._root
+            pending = list(self._pending)
+            self.stats["queries"] += 1
+        if k < 1:
+            return []
+        search(root)
+        for point, restaurant in pending:
+            consider(point, restaurant)
+
+        results = sorted(best, key=lambda entry: -entry[0])
+        return [(restaurant, round(chord_to_km(math.sqrt(-distance)), 2)) for distance, _, restaurant in results]
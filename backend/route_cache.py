@@ -0,0 +1,167 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class RouteCache:
+    """
+    Two-tier cache for route lookups: an in-memory LRU in front of an optional
+    MongoDB collection shared by every replica.
+
+    Routes are keyed by origin and destination rounded to `precision` decimal
+    places (4 places is about 11 m). An entry is fresh for ttl_seconds. After
+    that, for up to stale_seconds more, the cached route is still returned
+    straight away while one background refresh fetches a new one
+    (stale-while-revalidate). Older entries are treated as misses and fetched
+    inline. Failed lookups are never cached.
+    """
+
+    def __init__(self, fetch, collection=None, max_entries=2048, ttl_seconds=86400,
+                 stale_seconds=7 * 86400, precision=4, refresh_workers=2):
+        self.fetch = fetch
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.precision = precision
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="route-refresh")
+        self.stats = {
+            "memory_hits": 0,
+            "store_hits": 0,
+            "stale_served": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "fetch_errors": 0,
+            "store_errors": 0
+        }
+
+    def key(self, origin_lat, origin_lng, dest_lat, dest_lng):
+        p = self.precision
+        return f"{round(float(origin_lat), p)},{round(float(origin_lng), p)}:{round(float(dest_lat), p)},{round(float(dest_lng), p)}"
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.stats["memory_hits"] + self.stats["store_hits"] + self.stats["misses"]
+            hits = self.stats["memory_hits"] + self.stats["store_hits"]
+            return dict(
+                self.stats,
+                size=len(self._entries),
+                refreshing=len(self._refreshing),
+                hit_ratio=round(hits / lookups, 3) if lookups else 0.0
+            )
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, route, fetched_at):
+        with self._lock:
+            self._entries[key] = (route, fetched_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _from_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _from_store(self, key):
+        if self.collection is None:
+            return None
+        try:
+            doc = self.collection.find_one({"_id": key}, {"route": 1, "fetched_at": 1})
+        except PyMongoError as e:
+            self._count("store_errors")
+            print(f"Route cache store read failed: {str(e)}")
+            return None
+        if not doc:
+            return None
+        # Stored as naive UTC, like every datetime pymongo reads back
+        return doc["route"], (doc["fetched_at"] - EPOCH).total_seconds()
+
+    def _save(self, key, route):
+        fetched_at = time.time()
+        self._remember(key, route, fetched_at)
+        if self.collection is None:
+            return
+        try:
+            self.collection.replace_one(
+                {"_id": key},
+                {"route": route, "fetched_at": datetime.utcfromtimestamp(fetched_at)},
+                upsert=True
+            )
+        except PyMongoError as e:
+            self._count("store_errors")
+            print(f"Route cache store write failed: {str(e)}")
+
+    def _fetch(self, key, coordinates):
+        try:
+            route = self.fetch(*coordinates)
+        except Exception as e:
+            print(f"Route fetch failed for {key}: {str(e)}")
+            route = None
+        if route and route.get("route_found"):
+            self._save(key, route)
+            return route
+        self._count("fetch_errors")
+        return route
+
+    def _refresh(self, key, coordinates):
+        try:
+            self._count("refreshes")
+            self._fetch(key, coordinates)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key, coordinates):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._refresh_executor.submit(self._refresh, key, coordinates)
+
+    def get(self, origin_lat, origin_lng, dest_lat, dest_lng):
+        """Return the route, from cache when possible; None if it cannot be fetched"""
+        coordinates = (origin_lat, origin_lng, dest_lat, dest_lng)
+        key = self.key(*coordinates)
+        now = time.time()
+
+        entry = self._from_memory(key)
+        hit = "memory_hits"
+        if entry is None or now - entry[1] > self.ttl_seconds:
+            # Memory copy missing or stale: another replica may have a fresher one
+            stored = self._from_store(key)
+            if stored is not None and (entry is None or stored[1] > entry[1]):
+                entry = stored
+                hit = "store_hits"
+                self._remember(key, *stored)
+
+        if entry is not None:
+            age = now - entry[1]
+            if age <= self.ttl_seconds:
+                self._count(hit)
+                return entry[0]
+            if age <= self.ttl_seconds + self.stale_seconds:
+                self._count(hit)
+                self._count("stale_served")
+                self._schedule_refresh(key, coordinates)
+                return entry[0]
+
+        self._count("misses")
+        return self._fetch(key, coordinates)
@@ -24,7 +24,8 @@ class CustomJSONEncoder(json.JSONEncoder):
         return super().default(obj)
 
 # Set up MongoDB connection
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
 client = MongoClient(config.MONGODB_URI)
 db = client["bitebuddies"]  # Use the correct database name
 account_collection = db["account"]  # Use the account collection instead of users
@@ -34,6 +35,9 @@ search_requests_collection = db["search_requests"]
 # Import matching service
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import matching_service
+from expiry_scheduler import ExpiryScheduler
+from match_waiters import MatchWaiters
+from db_indexes import ensure_indexes_in_background
 
 app = Flask(__name__)
 # Configure custom JSON encoder
@@ -161,73 +165,6 @@ def publish_message(queue_name, message):
         
         return False
 
-# Function to clean up expired search requests
-def cleanup_expired_search_requests():
-    """Clean up search requests that have expired (older than 20 seconds)."""
-    while True:
-        try:
-            current_time = datetime.now()
-            
-            # Mark expired search requests as expired
-            search_result = db.search_requests.update_many(
-                {"expires_at": {"$lt": current_time}, "status": "active"},
-                {"$set": {"status": "expired"}}
-            )
-            
-            # Get all active users (those with active search requests)
-            active_users = set()
-            active_search_requests = list(db.search_requests.find({
-                "status": "active",
-                "expires_at": {"$gte": current_time}
-            }))
-            
-            for request in active_search_requests:
-                active_users.add(request["user_email"])
-            
-            # Find and expire matches where either user is no longer active
-            if active_search_requests:
-                # Expire matches for users who are no longer actively searching
-                matches_result = db.matches.update_many(
-                    {
-                        "$or": [
-                            {"user_email": {"$nin": list(active_users)}, "status": "pending"},
-                            {"match_email": {"$nin": list(active_users)}, "status": "pending"}
-                        ]
-                    },
-                    {"$set": {"status": "expired"}}
-                )
-                
-                if matches_result.modified_count > 0:
-                    print(f"Expired {matches_result.modified_count} matches for inactive users")
-                
-            # Also expire matches from expired search requests as before
-            if search_result.modified_count > 0:
-                print(f"Cleaned up {search_result.modified_count} expired search requests")
-                
-                # Find expired search requests
-                expired_searches = list(db.search_requests.find(
-                    {"expires_at": {"$lt": current_time}, "status": "expired"},
-                    {"_id": 1}
-                ))
-                
-                expired_ids = [str(doc["_id"]) for doc in expired_searches]
-                
-                # Mark matches from expired searches as expired
-                if expired_ids:
-                    match_result = db.matches.update_many(
-                        {"search_request_id": {"$in": expired_ids}, "status": "pending"},
-                        {"$set": {"status": "expired"}}
-                    )
-                    
-                    print(f"Expired {match_result.modified_count} matches from expired search requests")
-            
-        except Exception as e:
-            print(f"Error cleaning up expired search requests: {str(e)}")
-            traceback.print_exc()
-        
-        # Run every 2 seconds
-        time.sleep(2)
-
 # Helper function to serialize MongoDB documents for JSON
 def serialize_doc(doc):
     if doc is None:
@@ -250,13 +187,26 @@ def serialize_doc(doc):
             result[key] = value
     return result
 
-# Start the cleanup thread when the app starts
-cleanup_thread = threading.Thread(target=cleanup_expired_search_requests, daemon=True)
-cleanup_thread.start()
+# Expiry scheduler for active search requests
+expiry_scheduler = ExpiryScheduler(db)
 
-# Initialize RabbitMQ on startup
-print("Initializing RabbitMQ connection...")
-initialize_rabbitmq()
+# Wakes long-polling /api/search/wait requests when matches are saved
+match_waiters = MatchWaiters(db, fallback_recheck=config.SEARCH_WAIT_RECHECK_SECONDS)
+# Matches saved in this process, by the queue consumers or inline, wake waiters directly
+matching_service.add_match_listener(match_waiters.notify)
+
+# Start background work; kept out of import so the module can be loaded by tools and benchmarks
+def start_background_tasks():
+    ensure_indexes_in_background(db, ["account", "search_requests", "matches"])
+    expiry_scheduler.start()
+    match_waiters.start()
+    threading.Thread(target=consume_account_updates, daemon=True).start()
+    # Match queued search requests in this process (falls back to a change stream without RabbitMQ)
+    threading.Thread(target=matching_service.start_consuming, daemon=True).start()
+    
+    # Initialize RabbitMQ on startup
+    print("Initializing RabbitMQ connection...")
+    initialize_rabbitmq()
 
 # API Routes
 @app.route("/api/search", methods=["POST"])
@@ -309,17 +259,14 @@ def submit_search_request():
         # Save the search request to the database
         request_id = search_requests_collection.insert_one(search_request).inserted_id
         search_request_id = str(request_id)
+        expiry_scheduler.schedule(search_request_id, user_email, search_request["expires_at"])
         
         # Create user preferences object for matching
         preferences = {
             "restaurant": restaurant
         }
         
-        # Use direct matching for immediate results
-        matches = find_matches(user_email, standardized_location, preferences, search_request_id)
-        print(f"Direct matching found {len(matches)} matches")
-        
-        # Add the search request to the queue for asynchronous continued matching
+        # Hand the search request to the matching service queue
         queue_message = {
             "user_email": user_email,
             "location": standardized_location,
@@ -330,10 +277,14 @@ def submit_search_request():
         
         # Publish to RabbitMQ queue
         published = publish_message(config.SEARCH_REQUEST_QUEUE, queue_message)
+        matches = []
         if published:
             print(f"Published search request to queue: {user_email}")
         else:
-            print(f"Failed to publish search request to queue: {user_email}")
+            # Match inline so the request is not lost; the claim in the matcher
+            # keeps the change stream fallback from evaluating it a second time
+            print(f"Failed to publish search request to queue, matching inline: {user_email}")
+            matches = find_matches(user_email, standardized_location, preferences, search_request_id)
         
         return jsonify({
             "code": 200,
@@ -349,6 +300,87 @@ def submit_search_request():
         traceback.print_exc()
         return jsonify({"code": 500, "message": f"Error: {str(e)}"}), 500
 
+# Function to build the status of a search request from one user's perspective
+def build_search_status(search_request_id, user_email):
+    """Return (payload, http_status) with the user's pending matches, read-only."""
+    # Find the search request
+    search_request = db.search_requests.find_one(
+        {"_id": ObjectId(search_request_id)},
+        {"expires_at": 1, "processed": 1}
+    )
+    if not search_request:
+        return {"error": "Search request not found"}, 404
+        
+    # Check if the search request has expired
+    if search_request.get("expires_at") and search_request["expires_at"] < datetime.now():
+        return {
+            "status": "expired",
+            "matches": [],
+            "proximity_threshold_km": config.PROXIMITY_THRESHOLD_KM
+        }, 200
+
+    # Get matches for this user in BOTH directions - either as user_email or match_email
+    matches = list(db.matches.find({
+        "$or": [
+            {"user_email": user_email, "status": "pending"},
+            {"match_email": user_email, "status": "pending"}
+        ]
+    }))
+
+    # Resolve the user and everyone they matched with in a single lookup
+    profiles = get_account_profiles(
+        [user_email] + [match.get("user_email") for match in matches] + [match.get("match_email") for match in matches]
+    )
+    user = profiles.get(user_email)
+    if not user:
+        return {"error": "User not found"}, 404
+        
+    if not user.get("name"):
+        return {"error": "User profile incomplete - name required"}, 400
+
+    # Process matches to remove duplicates and ensure proper name handling
+    processed_matches = []
+    seen_pairs = set()
+
+    for match in matches:
+        # Present every match from the current user's perspective
+        other_email = match["user_email"] if match.get("match_email") == user_email else match.get("match_email")
+        
+        # Create a unique identifier for this match pair
+        match_pair = tuple(sorted([user_email, other_email or ""]))
+        
+        # Skip if we've already seen this pair
+        if match_pair in seen_pairs:
+            continue
+            
+        seen_pairs.add(match_pair)
+        
+        # Only show matches whose user still has a named profile
+        other_user = profiles.get(other_email)
+        if not other_user or not other_user.get("name"):
+            continue
+        
+        # Fill in the latest names and preferences on the response only
+        match["user_email"] = user_email
+        match["user_name"] = user["name"]
+        match["user_preferences"] = user.get("preferences", {})
+        match["match_email"] = other_email
+        match["match_name"] = other_user["name"]
+        match["match_preferences"] = other_user.get("preferences", {})
+        match["_id"] = str(match["_id"])
+        processed_matches.append(match)
+
+    print(f"Found {len(processed_matches)} matches for user {user_email}")
+    
+    response = {
+        "status": "completed" if search_request.get("processed") else "processing",
+        "matches": processed_matches,
+        "proximity_threshold_km": config.PROXIMITY_THRESHOLD_KM,
+        "expires_at": search_request.get("expires_at")
+    }
+
+    return response, 200
+
 @app.route("/api/search/status/<search_request_id>", methods=["GET"])
 def get_search_status(search_request_id):
     try:
@@ -357,91 +389,45 @@ def get_search_status(search_request_id):
         if not user_email:
             return jsonify({"error": "user_email is required"}), 400
 
-        # Find the user to ensure they exist and have a name
-        user = db.account.find_one({"email": user_email})
-        if not user:
-            return jsonify({"error": "User not found"}), 404
-            
-        if not user.get("name"):
-            return jsonify({"error": "User profile incomplete - name required"}), 400
-
-        # Find the search request
-        search_request = db.search_requests.find_one({"_id": ObjectId(search_request_id)})
-        if not search_request:
-            return jsonify({"error": "Search request not found"}), 404
-            
-        # Check if the search request has expired
-        if search_request.get("expires_at") and search_request["expires_at"] < datetime.now():
-            return jsonify({
-                "status": "expired",
-                "matches": [],
-                "proximity_threshold_km": config.PROXIMITY_THRESHOLD_KM
-            })
-
-        # Update existing matches with user's latest preferences
-        update_existing_matches_with_preferences(user_email)
-
-        # IMPROVED: Get matches for this user in BOTH directions - either as user_email or match_email
-        matches = list(db.matches.find({
-            "$or": [
-                {"search_request_id": search_request_id, "user_email": user_email, "status": "pending"},
-                {"user_email": user_email, "status": "pending"},
-                {"match_email": user_email, "status": "pending"} # ADDED: Check if user is in match_email field
-            ]
-        }))
-
-        # Process matches to remove duplicates and ensure proper name handling
-        processed_matches = []
-        seen_pairs = set()
-
-        for match in matches:
-            # Check if the current user is the match_email (reverse match case)
-            if match.get("match_email") == user_email:
-                # Swap the fields to maintain consistency from the user's perspective
-                temp_email = match["user_email"]
-                temp_name = match["user_name"]
-                temp_prefs = match.get("user_preferences", {})
-                
-                match["user_email"] = user_email
-                match["user_name"] = user.get("name")
-                match["user_preferences"] = user.get("preferences", {})
-                
-                match["match_email"] = temp_email
-                match["match_name"] = temp_name
-                match["match_preferences"] = temp_prefs
-            
-            # Create a unique identifier for this match pair
-            match_pair = tuple(sorted([match.get("user_email", ""), match.get("match_email", "")]))
-            
-            # Skip if we've already seen this pair
-            if match_pair in seen_pairs:
-                continue
-                
-            seen_pairs.add(match_pair)
-            
-            # Ensure match has proper name fields
-            match_user = db.account.find_one({"email": match["match_email"]})
-            if match_user and match_user.get("name"):
-                match["match_name"] = match_user["name"]
-                processed_matches.append(match)
+        payload, status_code = build_search_status(search_request_id, user_email)
+        return jsonify(payload), status_code
 
-        # Convert ObjectId to string for JSON serialization
-        for match in processed_matches:
-            if '_id' in match:
-                match['_id'] = str(match['_id'])
+    except Exception as e:
+        print(f"Error getting search status: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": "Internal server error"}), 500
 
-        print(f"Found {len(processed_matches)} matches for user {user_email}")
+# Long-poll endpoint: blocks until the user has more than `known` matches, the request expires, or `timeout` passes
+@app.route("/api/search/wait/<search_request_id>", methods=["GET"])
+def wait_for_search_results(search_request_id):
+    try:
+        user_email = request.args.get('user_email')
+        if not user_email:
+            return jsonify({"error": "user_email is required"}), 400
         
-        response = {
-            "status": "completed" if search_request.get("processed") else "processing",
-            "matches": processed_matches,
-            "proximity_threshold_km": config.PROXIMITY_THRESHOLD_KM
-        }
-
-        return jsonify(response)
+        known = request.args.get('known', default=0, type=int)
+        timeout = request.args.get('timeout', default=config.SEARCH_WAIT_MAX_SECONDS, type=float)
+        deadline = time.time() + max(0, min(timeout, config.SEARCH_WAIT_MAX_SECONDS))
+        
+        while True:
+            # Read the version before checking, so a match saved in between still wakes us
+            version = match_waiters.version(user_email)
+            payload, status_code = build_search_status(search_request_id, user_email)
+            if status_code != 200 or payload["status"] == "expired" or len(payload["matches"]) > known:
+                break
+            
+            remaining = deadline - time.time()
+            expires_at = payload.get("expires_at")
+            if expires_at:
+                remaining = min(remaining, (expires_at - datetime.now()).total_seconds() + 0.1)
+            if remaining <= 0:
+                break
+            match_waiters.wait(user_email, version, remaining)
+        
+        return jsonify(payload), status_code
 
     except Exception as e:
-        print(f"Error getting search status: {str(e)}")
+        print(f"Error waiting for search results: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": "Internal server error"}), 500
 
@@ -453,6 +439,16 @@ def health_check():
         "service": "search"
     }), 200
 
+# Expiry scheduler counters
+@app.route("/api/search/expiry/metrics", methods=["GET"])
+def expiry_metrics():
+    return jsonify(expiry_scheduler.metrics), 200
+
+# Match notification publisher counters (queued, confirmed, dropped, latency)
+@app.route("/api/search/publisher/metrics", methods=["GET"])
+def publisher_metrics():
+    return jsonify(matching_service.match_publisher.metrics()), 200
+
 # Endpoint to manually cleanup expired search requests
 @app.route("/api/search/cleanup", methods=["POST"])
 def cleanup_expired_requests():
@@ -513,69 +509,158 @@ def cleanup_expired_requests():
         traceback.print_exc()
         return jsonify({"success": False, "error": str(e)}), 500
 
-# Helper function to update all existing matches with a user's latest preferences
-def update_existing_matches_with_preferences(user_email):
-    """Update existing matches with the user's latest preferences."""
-    try:
-        # Get the user's current preferences
-        user = db.account.find_one({"email": user_email})
-        if not user:
-            print(f"User not found: {user_email}")
-            return
+# Short-lived cache of account names and preferences for status polling
+account_profile_cache = {}
+account_profile_cache_lock = threading.Lock()
 
-        current_preferences = user.get("preferences", {})
-        user_name = user.get("name")  # Get user's name
+# Helper function to look up names and preferences for many users with one query
+def get_account_profiles(emails):
+    """Return {email: {"name", "preferences"}} for the given emails, reusing recently fetched profiles."""
+    now = time.time()
+    profiles = {}
+    missing = set()
+    with account_profile_cache_lock:
+        for email in set(emails):
+            if not email:
+                continue
+            cached = account_profile_cache.get(email)
+            if cached and cached[0] > now:
+                if cached[1] is not None:
+                    profiles[email] = cached[1]
+            else:
+                missing.add(email)
 
-        # Update all matches where this user is either the user or the match
-        db.matches.update_many(
-            {"user_email": user_email, "status": "pending"},
-            {"$set": {
-                "user_preferences": current_preferences,
-                "user_name": user_name  # Update user's name
-            }}
-        )
+    if missing:
+        found = {}
+        for account in db.account.find({"email": {"$in": list(missing)}}, {"_id": 0, "email": 1, "name": 1, "preferences": 1}):
+            found[account["email"]] = {"name": account.get("name"), "preferences": account.get("preferences", {})}
+        expires = now + config.ACCOUNT_CACHE_TTL_SECONDS
+        with account_profile_cache_lock:
+            for email in missing:
+                # Remember unknown users too, so they are not looked up on every poll
+                account_profile_cache[email] = (expires, found.get(email))
+            # Drop expired entries so the cache only holds recently active users
+            if len(account_profile_cache) > 10000:
+                for email in [email for email, cached in account_profile_cache.items() if cached[0] <= now]:
+                    del account_profile_cache[email]
+        profiles.update(found)
 
-        db.matches.update_many(
-            {"match_email": user_email, "status": "pending"},
-            {"$set": {
-                "match_preferences": current_preferences,
-                "match_name": user_name  # Update user's name as match
-            }}
+    return profiles
+
+# Helper function to update all pending matches with a user's latest profile
+def update_existing_matches_with_preferences(user_email, user_name, preferences, previous_email=None):
+    """Copy a user's latest name and preferences (and new email, if changed) into their pending matches."""
+    old_email = previous_email or user_email
+    if old_email == user_email:
+        result = db.matches.bulk_write([
+            UpdateMany(
+                {"user_email": user_email, "status": "pending"},
+                {"$set": {"user_name": user_name, "user_preferences": preferences}}
+            ),
+            UpdateMany(
+                {"match_email": user_email, "status": "pending"},
+                {"$set": {"match_name": user_name, "match_preferences": preferences}}
+            )
+        ], ordered=False)
+        modified = result.modified_count
+    else:
+        modified = rename_pending_matches(old_email, user_email, user_name, preferences)
+    
+    # Status polls should see the change straight away
+    with account_profile_cache_lock:
+        account_profile_cache.pop(user_email, None)
+        account_profile_cache.pop(old_email, None)
+    
+    return modified
+
+# Function to move a user's pending matches to their new email
+def rename_pending_matches(old_email, new_email, user_name, preferences):
+    """
+    Rewrite each pending match that involves old_email, recomputing its pair_key
+    so pair-keyed dedup keeps working. A user has only a handful of pending
+    matches, so each gets its own update. A match that would duplicate a
+    pending match the new email already has for the same pair is deleted.
+    """
+    operations = []
+    match_ids = []
+    for match in db.matches.find(
+        {"status": "pending", "$or": [{"user_email": old_email}, {"match_email": old_email}]},
+        {"user_email": 1, "match_email": 1}
+    ):
+        fields = {}
+        if match["user_email"] == old_email:
+            fields.update(user_email=new_email, user_name=user_name, user_preferences=preferences)
+        if match["match_email"] == old_email:
+            fields.update(match_email=new_email, match_name=user_name, match_preferences=preferences)
+        fields["pair_key"] = matching_service.pair_key(
+            fields.get("user_email", match["user_email"]),
+            fields.get("match_email", match["match_email"])
         )
+        operations.append(UpdateOne({"_id": match["_id"], "status": "pending"}, {"$set": fields}))
+        match_ids.append(match["_id"])
+    
+    if not operations:
+        return 0
+    try:
+        return db.matches.bulk_write(operations, ordered=False).modified_count
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        duplicates = [match_ids[error["index"]] for error in errors]
+        db.matches.delete_many({"_id": {"$in": duplicates}, "status": "pending"})
+        print(f"Removed {len(duplicates)} pending matches that duplicated {new_email}'s existing ones")
+        return e.details.get("nModified", 0)
 
+# RabbitMQ callback for account-changed events published by account_service
+def handle_account_updated(ch, method, properties, body):
+    try:
+        event = json.loads(body)
+        modified = update_existing_matches_with_preferences(
+            event["email"],
+            event.get("name"),
+            event.get("preferences", {}),
+            event.get("previous_email")
+        )
+        print(f"Applied account update for {event['email']} to {modified} pending matches")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+    except (ValueError, KeyError) as e:
+        print(f"Dropping malformed account update event: {str(e)}")
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
     except Exception as e:
-        print(f"Error updating existing matches: {str(e)}")
+        print(f"Error applying account update: {str(e)}")
         traceback.print_exc()
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=not method.redelivered)
+
+# Function run by the account update consumer thread
+def consume_account_updates():
+    backoff = 1
+    while True:
+        try:
+            # Use a dedicated connection; the shared publishing connection is not thread-safe
+            connection = matching_service.get_publisher_connection()
+            channel = connection.channel()
+            channel.queue_declare(queue=config.ACCOUNT_UPDATED_QUEUE, durable=True)
+            channel.basic_qos(prefetch_count=10)
+            channel.basic_consume(queue=config.ACCOUNT_UPDATED_QUEUE, on_message_callback=handle_account_updated)
+            print("Waiting for account update events")
+            backoff = 1
+            channel.start_consuming()
+        except Exception as e:
+            print(f"Account update consumer error: {str(e)}; reconnecting in {backoff}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
 
 def process_search_request_directly(search_request):
     """Process a search request directly when RabbitMQ is unavailable."""
     try:
         print(f"Processing search request directly for user: {search_request['user_email']}")
-        
-        # Find the user to ensure they exist and have a name
-        user = db.account.find_one({"email": search_request["user_email"]})
-        if not user or not user.get("name"):
-            print(f"User not found or has no name: {search_request['user_email']}")
-            return
-            
-        # Find potential matches
-        matches = find_matches(
+        find_matches(
             user_email=search_request["user_email"],
             user_location=search_request["location"],
-            user_preferences=search_request["preferences"],
-            search_request_id=search_request.get("search_request_id")
-        )
-        
-        if matches:
-            # Save matches to database
-            save_matches(matches)
-            
-        # Mark the request as processed
-        db.search_requests.update_one(
-            {"_id": ObjectId(search_request["_id"])},
-            {"$set": {"processed": True}}
+            user_preferences={"restaurant": search_request.get("restaurant") or {}},
+            search_request_id=str(search_request["_id"])
         )
-        
         print(f"Completed direct processing of search request for user: {search_request['user_email']}")
         
     except Exception as e:
@@ -583,155 +668,27 @@ def process_search_request_directly(search_request):
         traceback.print_exc()
 
 def find_matches(user_email, user_location, user_preferences, search_request_id):
-    """Find potential matches for a user."""
+    """
+    Match a search request inline through the matching service's incremental
+    matcher. Only used when the request could not be queued; queued requests
+    are matched by the consumer pool started in start_background_tasks.
+    """
     try:
-        print(f"Finding matches for {user_email} with search request ID: {search_request_id}")
-        print(f"User location: {user_location}")
-        print(f"User preferences: {user_preferences}")
-        
-        # Get all active search requests except the user's own request
-        current_time = datetime.now()
-        other_requests = list(search_requests_collection.find({
-            "user_email": {"$ne": user_email},
-            "status": "active",
-            "expires_at": {"$gte": current_time}
-        }))
-        
-        if not other_requests:
-            print(f"No active search requests found for matching with {user_email}")
-            return []
-            
-        print(f"Found {len(other_requests)} potential matching requests for {user_email}")
-        
-        # Calculate distances and find matching requests
-        matches = []
-        for request in other_requests:
-            try:
-                print(f"Checking potential match: {request['user_email']}")
-                
-                # Avoid matching with the same user
-                if request["user_email"] == user_email:
-                    continue
-                    
-                # Calculate distance between users
-                other_location = request.get("location", {})
-                if not other_location or not user_location:
-                    print(f"Missing location data for {request['user_email']} or {user_location}")
-                    continue
-                    
-                # Check if location has lat/lng or latitude/longitude keys
-                user_lat = user_location.get("lat", user_location.get("latitude"))
-                user_lng = user_location.get("lng", user_location.get("longitude"))
-                other_lat = other_location.get("lat", other_location.get("latitude"))
-                other_lng = other_location.get("lng", other_location.get("longitude"))
-                
-                # Make sure we have location values for both users
-                if not user_lat or not user_lng or not other_lat or not other_lng:
-                    print(f"Invalid location format for one of the users: {user_location} vs {other_location}")
-                    continue
-                
-                # Calculate the distance between the two users
-                distance = matching_service.calculate_distance(
-                    float(user_lat), float(user_lng), 
-                    float(other_lat), float(other_lng)
-                )
-                
-                # Check if the restaurant preferences match
-                user_restaurant = user_preferences.get("restaurant", {})
-                other_restaurant = request.get("restaurant", {})
-                
-                print(f"User restaurant: {user_restaurant.get('name', 'N/A')}, Other restaurant: {other_restaurant.get('name', 'N/A')}")
-                restaurant_match = user_restaurant.get('name') == other_restaurant.get('name')
-                
-                # Get the actual distance threshold used for this match
-                proximity_threshold = float(request.get("proximity_threshold_km", config.PROXIMITY_THRESHOLD_KM))
-                print(f"Distance: {distance}km, Threshold: {proximity_threshold}km, Restaurant match: {restaurant_match}")
-                
-                # Check if the distance is within the threshold
-                if distance <= proximity_threshold:
-                    print(f"Found match with {request['user_email']} at distance {distance}km (within threshold {proximity_threshold}km)")
-                    
-                    # Get the user details for the matching user
-                    try:
-                        match_details = account_collection.find_one({"email": request["user_email"]})
-                        if not match_details:
-                            print(f"Warning: No account details found for {request['user_email']}")
-                            match_details = {"email": request["user_email"], "name": "Unknown User"}
-                    except Exception as e:
-                        print(f"Error fetching account details: {str(e)}")
-                        match_details = {"email": request["user_email"], "name": "Unknown User"}
-                        
-                    # Create the match
-                    match = {
-                        "user_email": user_email,
-                        "match_email": request["user_email"],
-                        "match_id": f"{user_email}:{request['user_email']}:{search_request_id}",
-                        "search_request_id": search_request_id,
-                        "distance": round(distance, 2),
-                        "created_at": datetime.now(),
-                        "status": "pending",
-                        "restaurant": other_restaurant or user_restaurant,
-                        "match_details": match_details
-                    }
-                    matches.append(match)
-            except Exception as e:
-                print(f"Error processing potential match {request.get('user_email', 'unknown')}: {str(e)}")
-                traceback.print_exc()
-                continue
-                
-        print(f"Found {len(matches)} matches for {user_email}")
-        
-        # If we found matches, save them to the database
-        if matches:
-            save_matches(matches)
-            
-        return matches
+        matches = matching_service.process_search_request(
+            direct_data={
+                "user_email": user_email,
+                "location": user_location,
+                "preferences": user_preferences,
+                "search_request_id": search_request_id
+            },
+            mongo_db=db
+        )
+        return matches or []
     except Exception as e:
         print(f"Error in find_matches: {str(e)}")
         traceback.print_exc()
         return []
 
-# Function to save matches to the database and notify users
-def save_matches(matches):
-    """Save matches to the database and notify users"""
-    if not matches:
-        return
-        
-    try:
-        # Save to database
-        for match in matches:
-            # Check if match already exists
-            existing_match = matches_collection.find_one({
-                "user_email": match["user_email"],
-                "match_email": match["match_email"],
-                "search_request_id": match["search_request_id"]
-            })
-            
-            if not existing_match:
-                # Insert new match
-                result = matches_collection.insert_one(match)
-                match_id = str(result.inserted_id)
-                print(f"Saved new match {match_id} between {match['user_email']} and {match['match_email']}")
-                
-                # Send notification about the match
-                notification = {
-                    "type": "match_found",
-                    "user_email": match["user_email"],
-                    "match_email": match["match_email"],
-                    "match_id": match["match_id"],
-                    "distance": match["distance"],
-                    "restaurant": match.get("restaurant", {}),
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                # Publish match notification
-                publish_message(config.MATCH_NOTIFICATION_QUEUE, notification)
-            else:
-                print(f"Match already exists between {match['user_email']} and {match['match_email']}")
-    except Exception as e:
-        print(f"Error saving matches: {str(e)}")
-        traceback.print_exc()
-
 # Meeting API Endpoints
 @app.route("/api/meeting/request", methods=["POST"])
 def create_meeting_request():
@@ -1156,4 +1113,10 @@ def get_meeting_status(meeting_id):
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=config.SEARCH_SERVICE_PORT, debug=True) 
\ No newline at end of file
+    # In debug mode the reloader runs this file twice: a watcher process and the
+    # one that serves requests. Only the serving one may run the matcher, so every
+    # search request meets the same in-memory index.
+    debug = True
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_tasks()
+    app.run(host="0.0.0.0", port=config.SEARCH_SERVICE_PORT, debug=debug) 
\ No newline at end of file
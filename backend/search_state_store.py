@@ -0,0 +1,155 @@
+"""
+State stores for composite searches.
+
+Both stores offer the same operations: create, get, update, transition (an
+atomic compare-and-set on status) and TTL eviction. MemorySearchStateStore
+keeps state in the process. MongoSearchStateStore shares it between replicas
+of the composite service, so status, select-match and cancel calls work on
+whichever replica they reach. Pick one with create_search_state_store().
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+
+class MemorySearchStateStore:
+    """
+    In-process table of composite searches, bounded by size and age.
+
+    Entries are evicted least-recently-used first once max_entries is reached,
+    and expire ttl_seconds after they were created. Every read and write takes
+    the same lock, and reads return copies, so request handlers and poller
+    threads never see a half-updated entry.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _expired(self, entry, now):
+        return now - entry["_stored_at"] > self.ttl_seconds
+
+    def _get_live(self, request_id, now):
+        entry = self._entries.get(request_id)
+        if entry is None:
+            return None
+        if self._expired(entry, now):
+            del self._entries[request_id]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(request_id)
+        return entry
+
+    def create(self, request_id, data):
+        """Store a new search, evicting the oldest entries if the table is full"""
+        now = time.time()
+        with self._lock:
+            self._entries[request_id] = dict(copy.deepcopy(data), _stored_at=now)
+            self._entries.move_to_end(request_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, request_id):
+        """Return a copy of the search, or None if it is unknown or expired"""
+        with self._lock:
+            entry = self._get_live(request_id, time.time())
+            if entry is None:
+                return None
+            data = copy.deepcopy(entry)
+        data.pop("_stored_at", None)
+        return data
+
+    def update(self, request_id, fields):
+        """Set fields on a search; returns False if it no longer exists"""
+        return self.transition(request_id, None, fields)
+
+    def transition(self, request_id, from_statuses, fields):
+        """
+        Atomically set fields only if the search's status is one of from_statuses
+        (or unconditionally when from_statuses is None). Returns True if applied.
+        """
+        with self._lock:
+            entry = self._get_live(request_id, time.time())
+            if entry is None:
+                return False
+            if from_statuses is not None and entry.get("status") not in from_statuses:
+                return False
+            entry.update(copy.deepcopy(fields))
+            return True
+
+    def evict_expired(self):
+        """Drop expired entries; returns how many were removed"""
+        now = time.time()
+        with self._lock:
+            expired = [request_id for request_id, entry in self._entries.items() if self._expired(entry, now)]
+            for request_id in expired:
+                del self._entries[request_id]
+            self.evictions += len(expired)
+        return len(expired)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class MongoSearchStateStore:
+    """
+    Composite searches stored in a MongoDB collection shared by all replicas.
+
+    Each search is one document keyed by request id. Transitions are single
+    conditional updates, so two replicas can never both move a search out of
+    the same status. Entries older than ttl_seconds are ignored on read and
+    removed by a TTL index on stored_at (see db_indexes.py).
+    """
+
+    def __init__(self, collection, ttl_seconds=3600):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+
+    def _live(self, request_id):
+        return {"_id": request_id, "stored_at": {"$gte": datetime.now() - timedelta(seconds=self.ttl_seconds)}}
+
+    def create(self, request_id, data):
+        self.collection.replace_one(
+            {"_id": request_id},
+            dict(data, stored_at=datetime.now()),
+            upsert=True
+        )
+
+    def get(self, request_id):
+        return self.collection.find_one(self._live(request_id), {"_id": 0, "stored_at": 0})
+
+    def update(self, request_id, fields):
+        return self.transition(request_id, None, fields)
+
+    def transition(self, request_id, from_statuses, fields):
+        query = self._live(request_id)
+        if from_statuses is not None:
+            query["status"] = {"$in": list(from_statuses)}
+        return self.collection.update_one(query, {"$set": fields}).matched_count == 1
+
+    def evict_expired(self):
+        result = self.collection.delete_many(
+            {"stored_at": {"$lt": datetime.now() - timedelta(seconds=self.ttl_seconds)}}
+        )
+        self.evictions += result.deleted_count
+        return result.deleted_count
+
+    def __len__(self):
+        return self.collection.count_documents({})
+
+
+def create_search_state_store(backend, db=None, max_entries=10000, ttl_seconds=3600):
+    """Build the store named by backend ("memory" or "mongo"; mongo needs db)"""
+    if backend == "mongo":
+        return MongoSearchStateStore(db.composite_searches, ttl_seconds=ttl_seconds)
+    if backend != "memory":
+        raise ValueError(f"Unknown search state backend: {backend}")
+    return MemorySearchStateStore(max_entries=max_entries, ttl_seconds=ttl_seconds)
@@ -0,0 +1,149 @@
+import heapq
+import math
+import threading
+from datetime import datetime
+
+from geo_distance import KM_PER_DEGREE, bounding_box, distances_from
+
+
+class SpatialGridIndex:
+    """
+    In-memory uniform lat/lng grid of active search requests.
+
+    Each entry is a dict with at least search_request_id, user_email,
+    latitude, longitude and expires_at. Entries are bucketed into square
+    cells of roughly cell_km, so a proximity query only has to look at the
+    cells that overlap the search radius instead of every active searcher.
+    Expired entries are dropped lazily using a min-heap keyed on expires_at.
+
+    Every entry gets a sequence number when it is first added, and an
+    evaluated_through watermark. Because an entry is always added before it
+    queries, the newer entry of any pair is guaranteed to see the older one;
+    matching each entry only against older, not-yet-evaluated entries
+    evaluates every pair exactly once.
+    """
+
+    def __init__(self, cell_km):
+        self.cell_deg = max(float(cell_km), 0.01) / KM_PER_DEGREE
+        self._cells = {}
+        self._entries = {}
+        self._expiry_heap = []
+        self._next_seq = 1
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cell_for(self, latitude, longitude):
+        return (int(math.floor(latitude / self.cell_deg)), int(math.floor(longitude / self.cell_deg)))
+
+    def _remove_locked(self, search_request_id):
+        entry = self._entries.pop(search_request_id, None)
+        if entry is None:
+            return None
+        cell = self._cell_for(entry["latitude"], entry["longitude"])
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(search_request_id, None)
+            if not bucket:
+                del self._cells[cell]
+        return entry
+
+    def add(self, entry):
+        """Insert or replace the entry for a search request and return the stored entry"""
+        search_request_id = str(entry["search_request_id"])
+        entry["search_request_id"] = search_request_id
+        with self._lock:
+            previous = self._remove_locked(search_request_id)
+            # Re-adding a request keeps its place in the sequence, its watermark
+            # and, in batch mode, whether it has already been paired
+            if previous is not None:
+                entry["seq"] = previous["seq"]
+                entry["evaluated_through"] = previous["evaluated_through"]
+                if previous.get("paired"):
+                    entry["paired"] = True
+            else:
+                entry["seq"] = self._next_seq
+                entry["evaluated_through"] = 0
+                self._next_seq += 1
+            cell = self._cell_for(entry["latitude"], entry["longitude"])
+            self._cells.setdefault(cell, {})[search_request_id] = entry
+            self._entries[search_request_id] = entry
+            if entry.get("expires_at"):
+                heapq.heappush(self._expiry_heap, (entry["expires_at"], search_request_id))
+        return entry
+
+    def mark_evaluated(self, search_request_id, seq):
+        """Advance a request's watermark once every entry up to seq has been evaluated"""
+        with self._lock:
+            entry = self._entries.get(str(search_request_id))
+            if entry is not None and seq > entry["evaluated_through"]:
+                entry["evaluated_through"] = seq
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._entries.clear()
+            self._expiry_heap = []
+
+    def remove(self, search_request_id):
+        """Remove a search request from the index, returning its entry if present"""
+        with self._lock:
+            return self._remove_locked(str(search_request_id))
+
+    def get(self, search_request_id):
+        with self._lock:
+            return self._entries.get(str(search_request_id))
+
+    def expire(self, now=None):
+        """Drop every entry whose expires_at is in the past and return their IDs"""
+        now = now or datetime.now()
+        expired = []
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] < now:
+                expires_at, search_request_id = heapq.heappop(self._expiry_heap)
+                entry = self._entries.get(search_request_id)
+                # Skip stale heap items left behind by a re-add with a new expiry
+                if entry is None or entry.get("expires_at") != expires_at:
+                    continue
+                self._remove_locked(search_request_id)
+                expired.append(search_request_id)
+        return expired
+
+    def nearby(self, latitude, longitude, radius_km, now=None):
+        """
+        Return (entry, distance_km) pairs within radius_km of the given point,
+        sorted by distance. Only the grid cells overlapping the radius are scanned.
+        """
+        now = now or datetime.now()
+        min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+        first_row, first_col = self._cell_for(min_lat, min_lng)
+        last_row, last_col = self._cell_for(max_lat, max_lng)
+
+        candidates = []
+        with self._lock:
+            for r in range(first_row, last_row + 1):
+                for c in range(first_col, last_col + 1):
+                    bucket = self._cells.get((r, c))
+                    if bucket:
+                        candidates.extend(bucket.values())
+
+        candidates = [entry for entry in candidates if not entry.get("expires_at") or entry["expires_at"] >= now]
+        if not candidates:
+            return []
+
+        distances, within = distances_from(
+            latitude,
+            longitude,
+            [entry["latitude"] for entry in candidates],
+            [entry["longitude"] for entry in candidates],
+            radius_km
+        )
+        results = [
+            (entry, round(float(distance), 2))
+            for entry, distance, inside in zip(candidates, distances, within)
+            if inside
+        ]
+
+        results.sort(key=lambda item: item[1])
+        return results
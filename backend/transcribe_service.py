@@ -15,6 +15,7 @@ import sys
 import requests
 import subprocess
 import uuid
+from pagination import paginate, InvalidCursor
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -134,8 +135,14 @@ def get_transcriptions():
         # Default user ID
         user_id = "default"
         
-        # Get transcriptions from MongoDB
-        transcriptions = list(db.transcriptions.find({"said_by": user_id}).sort("created_at", -1))
+        # Get one page of transcriptions from MongoDB, newest first
+        transcriptions, next_cursor = paginate(
+            db.transcriptions,
+            {"said_by": user_id},
+            sort=[("created_at", -1)],
+            limit=request.args.get('limit'),
+            cursor=request.args.get('cursor')
+        )
         
         # Convert ObjectId to string for JSON serialization
         for trans in transcriptions:
@@ -144,10 +151,13 @@ def get_transcriptions():
         return jsonify({
             "code": 200,
             "data": {
-                "transcriptions": transcriptions
+                "transcriptions": transcriptions,
+                "next_cursor": next_cursor
             }
         })
         
+    except InvalidCursor as e:
+        return jsonify({"code": 400, "message": str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching transcriptions: {str(e)}")
         return jsonify({
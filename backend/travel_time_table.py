@@ -0,0 +1,155 @@
+import math
+import threading
+import time
+import traceback
+from concurrent.futures import wait
+
+
+class TravelTimeTable:
+    """
+    Precomputed travel distance and time from a fixed origin to every restaurant.
+
+    A background thread lists all restaurants every refresh_interval seconds.
+    Only restaurants that are new, have moved, have no route yet, or whose route
+    is older than max_route_age are routed again; the rest keep their entry.
+    A restaurant whose route could not be found is not routed again until
+    retry_interval has passed. If routing raises, the restaurant keeps its
+    previous entry, or gets a fallback (straight-line) entry if it has none or
+    has moved. Removed restaurants are dropped. Each refresh publishes a new
+    snapshot sorted by travel time, so lookups are a filter over memory with
+    no outbound calls.
+    """
+
+    def __init__(self, list_restaurants, route_restaurant, executor, refresh_interval=300, max_route_age=86400,
+                 fallback=None, retry_interval=1800):
+        """
+        Args:
+            list_restaurants: Callable returning every restaurant (list of dicts)
+            route_restaurant: Callable (restaurant, lat, lng) returning the restaurant
+                enriched with "distance" (and "duration"/"route" when routed)
+            executor: Executor used to route restaurants in parallel
+            fallback: Optional callable (restaurant, lat, lng) returning an unrouted
+                entry, used when route_restaurant raises
+        """
+        self.list_restaurants = list_restaurants
+        self.route_restaurant = route_restaurant
+        self.executor = executor
+        self.refresh_interval = refresh_interval
+        self.max_route_age = max_route_age
+        self.fallback = fallback
+        self.retry_interval = retry_interval
+        self._entries = {}
+        self._snapshot = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "restaurants": 0,
+            "routed_last_refresh": 0,
+            "route_errors_last_refresh": 0,
+            "last_refresh_seconds": 0.0,
+            "last_refresh_at": None
+        }
+
+    def ready(self):
+        return self._snapshot is not None
+
+    def _needs_route(self, entry, lat, lng, now):
+        if entry is None or (entry["latitude"], entry["longitude"]) != (lat, lng):
+            return True
+        if now < entry.get("retry_at", 0):
+            # Routing failed last time: wait before asking the Route API again
+            return False
+        return entry["restaurant"].get("route") is None or now - entry["routed_at"] > self.max_route_age
+
+    def refresh(self):
+        """List restaurants, route the ones that changed, and publish a new snapshot"""
+        started = time.time()
+        restaurants = self.list_restaurants()
+        entries = {}
+        to_route = []
+
+        for restaurant in restaurants:
+            key = str(restaurant.get("_id") or restaurant.get("name"))
+            try:
+                lat = float(restaurant["latitude"])
+                lng = float(restaurant["longitude"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not lat or not lng:
+                continue
+
+            entry = self._entries.get(key)
+            if self._needs_route(entry, lat, lng, started):
+                to_route.append((key, restaurant, lat, lng))
+            else:
+                # Same place, still-fresh route: take the latest details, keep the route
+                enriched = dict(entry["restaurant"])
+                enriched.update(restaurant)
+                entries[key] = dict(entry, restaurant=enriched)
+
+        futures = {
+            self.executor.submit(self.route_restaurant, restaurant, lat, lng): (key, restaurant, lat, lng)
+            for key, restaurant, lat, lng in to_route
+        }
+        wait(futures)
+        route_errors = 0
+        for future, (key, restaurant, lat, lng) in futures.items():
+            try:
+                enriched = future.result()
+            except Exception as e:
+                print(f"Error routing restaurant {key}: {str(e)}")
+                route_errors += 1
+                previous = self._entries.get(key)
+                if previous is not None and (previous["latitude"], previous["longitude"]) == (lat, lng):
+                    # Keep serving what we had; it is retried after retry_interval
+                    entries[key] = dict(previous, retry_at=started + self.retry_interval)
+                elif self.fallback is not None:
+                    try:
+                        entries[key] = {"restaurant": self.fallback(restaurant, lat, lng), "latitude": lat,
+                                        "longitude": lng, "routed_at": started, "retry_at": started + self.retry_interval}
+                    except Exception as fallback_error:
+                        print(f"Error building fallback entry for restaurant {key}: {str(fallback_error)}")
+                continue
+            entry = {"restaurant": enriched, "latitude": lat, "longitude": lng, "routed_at": started}
+            if enriched.get("route") is None:
+                entry["retry_at"] = started + self.retry_interval
+            entries[key] = entry
+
+        snapshot = sorted(
+            (entry["restaurant"] for entry in entries.values()),
+            key=lambda r: r.get("duration", {}).get("seconds", math.inf) if r.get("duration") else math.inf
+        )
+        with self._lock:
+            self._entries = entries
+            self._snapshot = snapshot
+
+        self.stats["refreshes"] += 1
+        self.stats["restaurants"] = len(entries)
+        self.stats["routed_last_refresh"] = len(to_route)
+        self.stats["route_errors_last_refresh"] = route_errors
+        self.stats["last_refresh_seconds"] = round(time.time() - started, 3)
+        self.stats["last_refresh_at"] = started
+        print(f"Travel time table refreshed: {len(entries)} restaurants, {len(to_route)} routed")
+
+    def nearby(self, radius_km):
+        """Restaurants within radius_km of the origin, fastest first"""
+        snapshot = self._snapshot or []
+        return [restaurant for restaurant in snapshot if restaurant["distance"]["kilometers"] <= radius_km]
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.stats["refresh_errors"] += 1
+                print(f"Error refreshing travel time table: {str(e)}")
+                traceback.print_exc()
+            time.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
@@ -89,27 +89,44 @@ export const transcribeAudio = async (audioBlob, moduleId = '1', userEmail = 'de
   }
 };
 
+// List endpoints return one page per request. readPage(response) turns each
+// response into { items, nextCursor }; pages are fetched until nextCursor runs
+// out and every item is returned.
+export async function fetchAllPages(url, readPage) {
+  const items = [];
+  let cursor = null;
+  do {
+    const separator = url.includes('?') ? '&' : '?';
+    const response = await fetch(cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url);
+    const page = await readPage(response);
+    items.push(...page.items);
+    cursor = page.nextCursor;
+  } while (cursor);
+  return items;
+}
+
 export const getTranscriptions = async () => {
   try {
     console.log("Fetching transcriptions...");
     
-    const response = await fetch(`${API_URLS.COMPOSITE_CHATBOT_SERVICE}/transcriptions`);
-    console.log("Transcriptions response status:", response.status);
-    
-    // Handle non-JSON responses
-    const contentType = response.headers.get('content-type');
-    if (!contentType || !contentType.includes('application/json')) {
-      console.error('Non-JSON response received:', await response.text());
-      return [];
-    }
-    
-    const data = await response.json();
-    console.log("Transcriptions response:", data);
-    
-    if (data && data.code === 200) {
-      return data.data.transcriptions;
-    }
-    return [];
+    return await fetchAllPages(`${API_URLS.COMPOSITE_CHATBOT_SERVICE}/transcriptions`, async (response) => {
+      console.log("Transcriptions response status:", response.status);
+      
+      // Handle non-JSON responses
+      const contentType = response.headers.get('content-type');
+      if (!contentType || !contentType.includes('application/json')) {
+        console.error('Non-JSON response received:', await response.text());
+        return { items: [], nextCursor: null };
+      }
+      
+      const data = await response.json();
+      console.log("Transcriptions response:", data);
+      
+      if (data && data.code === 200) {
+        return { items: data.data.transcriptions, nextCursor: data.data.next_cursor };
+      }
+      return { items: [], nextCursor: null };
+    });
   } catch (error) {
     console.error('Error fetching transcriptions:', error);
     return [];
@@ -219,23 +236,25 @@ function getFallbackQuestions() {
 export async function getUserMeetings(userEmail) {
   try {
     console.log('Fetching meetings for user:', userEmail);
-    const response = await fetch(`${API_URLS.MEETING_SERVICE}/get_user_meetings/${encodeURIComponent(userEmail)}`);
-    console.log('Response status:', response.status);
-    
-    if (!response.ok) {
-      throw new Error(`Failed to fetch meetings: ${response.status}`);
-    }
-    
-    const meetings = await response.json();
-    console.log('Raw meetings data:', meetings);
-    
-    // Validate meeting data structure
-    if (!Array.isArray(meetings)) {
-      console.error('Meetings data is not an array:', meetings);
-      return [];
-    }
-    
-    return meetings;
+    return await fetchAllPages(`${API_URLS.MEETING_SERVICE}/get_user_meetings/${encodeURIComponent(userEmail)}`, async (response) => {
+      console.log('Response status:', response.status);
+      
+      if (!response.ok) {
+        throw new Error(`Failed to fetch meetings: ${response.status}`);
+      }
+      
+      const meetings = await response.json();
+      console.log('Raw meetings data:', meetings);
+      
+      // Validate meeting data structure
+      if (!Array.isArray(meetings)) {
+        console.error('Meetings data is not an array:', meetings);
+        return { items: [], nextCursor: null };
+      }
+      
+      // The cursor for the next page comes in a header
+      return { items: meetings, nextCursor: response.headers.get('X-Next-Cursor') };
+    });
   } catch (error) {
     console.error('Error fetching meetings:', error);
     throw error;